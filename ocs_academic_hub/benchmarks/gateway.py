@@ -0,0 +1,461 @@
+#
+# Local stand-in for the Hub GraphQL gateway: answers the operations of
+# ocs_academic_hub.queries (also packed with aliases by graphql_batch) from
+# synthetic dataviews and streams, with nextPage paging, latency, replies
+# sharing a link of `mbps` Mbit/s, a set-up time of new connections (the TLS
+# handshake of the real gateway) and injected 408/409/502 errors.
+#
+#   python benchmarks/gateway.py [--port 8080] [--width 8] [--latency 0.05]
+#       [--mbps 0] [--connect-latency 0] [--error-408 0.01] [--error-409 0.0]
+#       [--error-502 0.0]
+#
+# then: hub = hub_connect({"id_token": "x"}, "http://127.0.0.1:8080/graphql")
+#
+import argparse
+import base64
+import functools
+import gzip
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+from graphql.language import ast
+from graphql.language.parser import parse
+
+from ocs_academic_hub.streams import match_streams
+
+DIGITAL_STATES = np.array(["Closed", "Open"])
+DATA_START = pd.Timestamp("2020-01-01", tz="UTC")
+DATA_END = pd.Timestamp("2023-01-01", tz="UTC")
+
+
+class GatewayError(Exception):
+    def __init__(self, message, extensions=None):
+        super().__init__(message)
+        self.extensions = extensions or {"message": message}
+
+
+def utc(text):
+    timestamp = pd.Timestamp(text)
+    return timestamp.tz_localize("UTC") if timestamp.tz is None else timestamp
+
+
+def datetime64(timestamp):
+    return timestamp.tz_convert(None).to_datetime64().astype("datetime64[ns]")
+
+
+def iso(times):
+    return np.char.add(np.datetime_as_string(times, unit="s"), "Z")
+
+
+def encode_page(state):
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode()
+
+
+def decode_page(token):
+    return json.loads(base64.urlsafe_b64decode(token.encode()))
+
+
+class SyntheticData:
+    """Deterministic values of `width` fields (every 4th one digital) at any
+    time, so that pages and retries always see the same data"""
+
+    def __init__(self, width, stored_step="1min", asset_id="SIM01"):
+        self.width = width
+        self.fields = [f"Field_{k}" for k in range(width)]
+        self.digital = [k % 4 == 3 for k in range(width)]
+        self.stored_step = pd.Timedelta(stored_step)
+        self.asset_id = asset_id
+
+    def values(self, times, k):
+        seconds = (times - np.datetime64(0, "s")) / np.timedelta64(1, "s")
+        if self.digital[k]:
+            return ((seconds // 3600 + k) % 2).astype("int64")
+        return np.round(
+            50
+            + k
+            + 10 * np.sin(2 * np.pi * seconds / 86400 + k)
+            + 0.5 * np.sin(seconds / 97 + 7 * k),
+            3,
+        )
+
+    def grid(self, start, end, step, offset, count):
+        total = int((end - start) // step) + 1 if end >= start else 0
+        rows = np.arange(offset, min(offset + count, total))
+        return total, datetime64(start) + rows * np.timedelta64(step.value, "ns")
+
+    def interpolated(self, start, end, step, offset, count):
+        total, times = self.grid(start, end, step, offset, count)
+        columns = {"Timestamp": iso(times)}
+        for k, field in enumerate(self.fields):
+            values = self.values(times, k)
+            columns[field] = values
+            if self.digital[k]:
+                columns[f"{field}__ds"] = DIGITAL_STATES[values]
+        return total, pd.DataFrame(columns).to_csv(index=False)
+
+    def stored(self, start, end, offset, count):
+        # narrow rows grouped by field, as the gateway sends them
+        first = max(start, DATA_START).ceil(self.stored_step)
+        per_field, _ = self.grid(first, min(end, DATA_END), self.stored_step, 0, 0)
+        total = per_field * self.width
+        rows = np.arange(offset, min(offset + count, total))
+        records = []
+        for k in np.unique(rows // per_field) if per_field else []:
+            field_rows = rows[rows // per_field == k] % per_field
+            times = datetime64(first) + field_rows * np.timedelta64(
+                self.stored_step.value, "ns"
+            )
+            values = self.values(times, k)
+            values = DIGITAL_STATES[values] if self.digital[k] else values
+            records += [
+                {
+                    "Timestamp": t,
+                    "Asset_Id": self.asset_id,
+                    "Field": self.fields[k],
+                    "Value": v,
+                }
+                for t, v in zip(iso(times).tolist(), values.tolist())
+            ]
+        return total, records
+
+    def items(self, digital):
+        return [
+            {
+                "Id": f"{self.asset_id}.{field}",
+                "Name": f"{self.asset_id}.{field}",
+                "TypeId": "PI-Digital" if self.digital[k] else "PI-Float32",
+                "Metadata": [
+                    {"Name": "asset_id", "Value": self.asset_id},
+                    {"Name": "column_name", "Value": field},
+                    {"Name": "engunits", "Value": "-" if self.digital[k] else "degC"},
+                ],
+            }
+            for k, field in enumerate(self.fields)
+            if self.digital[k] == digital
+        ]
+
+
+class StandInGateway(ThreadingHTTPServer):
+    """GraphQL over HTTP on 127.0.0.1:`port` (0: any free port)"""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(
+        self,
+        port=0,
+        dataviews=None,
+        width=8,
+        streams=500,
+        latency=0.0,
+        row_latency=0.0,
+        mbps=0,
+        connect_latency=0.0,
+        reuse_replies=False,
+        errors=None,
+        max_values=400000,
+        page_values=100000,
+        seed=0,
+    ):
+        super().__init__(("127.0.0.1", port), GatewayHandler)
+        dataviews = dataviews or {"sim.dataview": width}
+        self.dataviews = {
+            dv_id: SyntheticData(dv_width) for dv_id, dv_width in dataviews.items()
+        }
+        self.streams = [
+            {
+                "Id": f"SIM.{i:05d}.PV",
+                "Name": f"Sim {i} {'Valve' if i % 4 == 3 else 'Temperature'}",
+                "TypeId": "PI-Float32",
+                "Description": f"synthetic stream {i}",
+            }
+            for i in range(streams)
+        ]
+        self.stream_data = SyntheticData(1, stored_step="10min")
+        self.latency = latency
+        self.row_latency = row_latency
+        self.mbps = mbps
+        self.connect_latency = connect_latency
+        self.link_free = 0.0
+        # replies made once: the gateway out of the way of client benchmarks
+        self.replies = {} if reuse_replies else None
+        self.errors = errors or {}
+        self.max_values = max_values
+        self.page_values = page_values
+        self.lock = threading.Lock()
+        self.rng = np.random.default_rng(seed)
+        self.requests = 0
+        self.bytes_sent = 0
+        self.connections = 0
+
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/graphql"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def send_time(self, size):
+        # replies queue on the shared link (0 Mbit/s: unlimited)
+        with self.lock:
+            if self.mbps == 0:
+                return 0.0
+            now = time.perf_counter()
+            self.link_free = max(now, self.link_free) + size * 8 / (self.mbps * 1e6)
+            return self.link_free - now
+
+    def reply(self, request, compress):
+        """Return (body, rows) of the reply to a GraphQL request, made once when
+        replies are reused (the same request always gets the same data)"""
+        key = (json.dumps(request, sort_keys=True), compress)
+        if self.replies is not None and key in self.replies:
+            return self.replies[key]
+        try:
+            data, errors, rows = self.execute(
+                request["query"], request.get("variables") or {}
+            )
+            reply = {"data": data}
+            if errors:
+                reply["errors"] = errors
+        except Exception as e:
+            reply, rows = {"errors": [{"message": f"400: {e}"}]}, 0
+        body = json.dumps(reply).encode()
+        if compress:
+            body = gzip.compress(body, compresslevel=5)
+        if self.replies is not None and "errors" not in reply:
+            self.replies[key] = body, rows
+        return body, rows
+
+    def injected_error(self):
+        with self.lock:
+            draws = {code: self.rng.random() for code in self.errors}
+        for code, rate in self.errors.items():
+            if draws[code] < rate:
+                return GatewayError(f"  {code}:Injected error.  URL {self.url()}")
+        return None
+
+    def execute(self, query, variables):
+        """Return (data, errors, rows) of a GraphQL request"""
+        operation = parse(query).definitions[0]
+        data = {}
+        errors = []
+        rows = [0]
+        for field in operation.selection_set.selections:
+            key = (field.alias or field.name).value
+            try:
+                data[key] = self.root(field, variables, rows)
+            except GatewayError as e:
+                data[key] = None
+                errors.append(
+                    {"message": str(e), "path": [key], "extensions": e.extensions}
+                )
+        return data, errors, rows[0]
+
+    def root(self, field, variables, rows):
+        name = field.name.value
+        args = arguments(field, variables)
+        if name == "databases":
+            return [{"name": args.get("where", {}).get("name", "sim")}]
+        error = self.injected_error()
+        if error is not None:
+            raise error
+        where = args.get("where", {})
+        if name == "dataViews":
+            dataview = self.dataviews.get(where.get("id"), None)
+            if dataview is None:
+                return []
+            resolve = functools.partial(
+                self.dataview_field, dataview, where=where, rows=rows
+            )
+            return [select(field.selection_set, variables, resolve)]
+        if name == "namespaces":
+            resolve = functools.partial(self.namespace_field, where=where, rows=rows)
+            return [select(field.selection_set, variables, resolve)]
+        raise GatewayError(f"400: unknown field {name}")
+
+    def dataview_field(self, dataview, name, args, where, rows):
+        if name == "id":
+            return where.get("id")
+        if name == "resolvedDataItems":
+            return {"Items": dataview.items(args["queryId"] == "Asset_digital")}
+        if name not in ["stored", "interpolated"]:
+            raise GatewayError(f"400: unknown dataview field {name}")
+        if args.get("nextPage"):
+            # a count sent with the token changes the size of the next pages
+            state = decode_page(args["nextPage"])
+            state["count"] = args.get("count") or state["count"]
+        else:
+            count = args.get("count") or self.page_values // dataview.width
+            state = dict(args, count=count, offset=0)
+        count = state["count"]
+        if count * dataview.width > self.max_values:
+            raise GatewayError(f"  408:Request Timeout.  URL {self.url()}")
+        start, end = utc(state["startIndex"]), utc(state["endIndex"])
+        if name == "stored":
+            total, page = dataview.stored(start, end, state["offset"], count)
+        else:
+            step = pd.Timedelta(state["interpolation"])
+            total, page = dataview.interpolated(
+                start, end, step, state["offset"], count
+            )
+        rows[0] += min(count, total - state["offset"])
+        offset = state["offset"] + count
+        next_page = encode_page(dict(state, offset=offset)) if offset < total else None
+        return {"nextPage": next_page, "data": page, "firstPage": None}
+
+    def stream(self, stream_id):
+        for stream in self.streams:
+            if stream["Id"] == stream_id:
+                return stream
+        raise GatewayError(
+            "404: Not Found", {"message": f"Stream {stream_id} not found"}
+        )
+
+    def namespace_field(self, name, args, where, rows):
+        if name == "id":
+            return where.get("id")
+        if name == "getStreams":
+            # the stand-in streams have the same metadata and tags
+            found = match_streams(
+                self.streams,
+                args.get("query") or "",
+                search_fields=["Id", "Name", "Description"],
+            )
+            skip = args.get("skip") or 0
+            return (found or [])[skip : skip + (args.get("count") or 100)]
+        stream = self.stream(args["stream_id"])
+        if name == "getStream":
+            return stream
+        if name == "metadata":
+            return [{"Name": "units", "Value": "degC"}]
+        if name == "tags":
+            return ["synthetic"]
+        data = self.stream_data
+        if name in ["getFirstValue", "getLastValue"]:
+            first = name == "getFirstValue"
+            times = np.array([datetime64(DATA_START if first else DATA_END)])
+            return {"Timestamp": iso(times)[0], "Value": data.values(times, 0)[0]}
+        start, end = utc(args["start"]), utc(args["end"])
+        if name == "getWindowValues":
+            start = max(start, DATA_START).ceil(data.stored_step)
+            _, times = data.grid(start, end, data.stored_step, 0, 10**6)
+        elif name == "getInterpolatedValues":
+            count = max(args["count"], 2)
+            _, times = data.grid(start, end, (end - start) / (count - 1), 0, count)
+        else:
+            raise GatewayError(f"400: unknown namespace field {name}")
+        rows[0] += len(times)
+        return [
+            {"Timestamp": t, "Value": v}
+            for t, v in zip(iso(times).tolist(), data.values(times, 0).tolist())
+        ]
+
+
+def value_of(node, variables):
+    if isinstance(node, ast.Variable):
+        return variables.get(node.name.value, None)
+    if isinstance(node, ast.IntValue):
+        return int(node.value)
+    if isinstance(node, ast.FloatValue):
+        return float(node.value)
+    if isinstance(node, ast.BooleanValue):
+        return node.value
+    if isinstance(node, ast.ListValue):
+        return [value_of(v, variables) for v in node.values]
+    if isinstance(node, ast.ObjectValue):
+        return {f.name.value: value_of(f.value, variables) for f in node.fields}
+    return node.value
+
+
+def arguments(field, variables):
+    return {a.name.value: value_of(a.value, variables) for a in field.arguments}
+
+
+def select(selection_set, variables, resolve):
+    result = {}
+    for field in selection_set.selections:
+        value = resolve(field.name.value, arguments(field, variables))
+        if field.selection_set is not None and isinstance(value, dict):
+            value = {
+                (f.alias or f.name).value: value.get(f.name.value, None)
+                for f in field.selection_set.selections
+            }
+        result[(field.alias or field.name).value] = value
+    return result
+
+
+class GatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # headers and body are written apart: without this, a keep-alive
+        # request waits for the delayed ACK of the headers (Nagle)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.lock:
+            self.server.connections += 1
+        time.sleep(self.server.connect_latency)
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        compress = "gzip" in self.headers.get("Accept-Encoding", "")
+        body, rows = server.reply(request, compress)
+        time.sleep(
+            server.latency + server.row_latency * rows + server.send_time(len(body))
+        )
+        self.send_response(200)
+        if compress:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            # asked by the client, which would otherwise reuse the connection
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+        with server.lock:
+            server.requests += 1
+            server.bytes_sent += len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--width", type=int, default=8)
+    parser.add_argument("--streams", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--row-latency", type=float, default=0.0)
+    parser.add_argument("--mbps", type=float, default=0)
+    parser.add_argument("--connect-latency", type=float, default=0.0)
+    for code in ["408", "409", "502"]:
+        parser.add_argument(f"--error-{code}", type=float, default=0.0)
+    args = parser.parse_args()
+    gateway = StandInGateway(
+        args.port,
+        width=args.width,
+        streams=args.streams,
+        latency=args.latency,
+        row_latency=args.row_latency,
+        mbps=args.mbps,
+        connect_latency=args.connect_latency,
+        errors={
+            code: getattr(args, f"error_{code}")
+            for code in ["408", "409", "502"]
+            if getattr(args, f"error_{code}") > 0
+        },
+    )
+    print(f"stand-in gateway on {gateway.url()} (dataview sim.dataview)")
+    gateway.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#
+# Parsing time of a stored dataview page: JSON round trip through
+# pd.read_json (previous path) vs columns built from the decoded records.
+#
+#   python benchmarks/stored_page.py [rows] [repeat]
+#
+import io
+import json
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from ocs_academic_hub.datahub import parse_stored_page
+
+
+def read_json_page(records):
+    return pd.read_json(io.StringIO(json.dumps(records)))
+
+
+def stored_records(rows, fields=8):
+    # narrow rows as sent by the gateway: grouped by field, digital states
+    # (strings) mixed with float values
+    rng = np.random.default_rng(0)
+    per_field = rows // fields
+    times = pd.date_range("2021-01-01", periods=per_field, freq="7s")
+    timestamps = list(times.strftime("%Y-%m-%dT%H:%M:%S.%fZ"))
+    records = []
+    for field in range(fields):
+        digital = field % 4 == 3
+        for i, timestamp in enumerate(timestamps):
+            records.append(
+                {
+                    "Timestamp": timestamp,
+                    "Asset_Id": "FV01",
+                    "Field": f"Field_{field}",
+                    "Value": ["Open", "Closed"][i % 2] if digital else rng.random(),
+                }
+            )
+    return records
+
+
+def main(rows=100000, repeat=5):
+    records = stored_records(rows)
+    pd.testing.assert_frame_equal(
+        read_json_page(records), parse_stored_page(records), check_dtype=False
+    )
+    print(f"stored page of {len(records)} records, best of {repeat}")
+    for name, parse in [
+        ("pd.read_json(json.dumps())", read_json_page),
+        ("parse_stored_page()", parse_stored_page),
+    ]:
+        best = min(timeit.repeat(lambda: parse(records), number=1, repeat=repeat))
+        print(
+            f"  {name:28} {best * 1000:9.1f} ms {len(records) / best:12,.0f} rows/sec"
+        )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
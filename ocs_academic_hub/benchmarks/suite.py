@@ -0,0 +1,208 @@
+#
+# Throughput of the HubClient fetch paths against the local stand-in gateway
+# (benchmarks/gateway.py): rows/sec, peak RSS and gateway requests per call.
+# Each path runs in a fresh process, without remembered page sizes.
+#
+#   python benchmarks/suite.py [--days 30] [--latency 0.02] [--error-408 0]
+#       [--only interpolated,stored] [--save results.json]
+#       [--compare baseline.json]
+#
+import argparse
+import asyncio
+import contextlib
+import io
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import pandas as pd
+from gateway import StandInGateway
+
+DATAVIEW = "sim.dataview"
+DATAVIEWS = {DATAVIEW: 8, "sim.dataview.2": 8, "sim.dataview.3": 8}
+NAMESPACE = "sim"
+
+
+def window(days):
+    start = pd.Timestamp("2021-01-01")
+    return str(start.date()), str((start + pd.Timedelta(days=days)).date())
+
+
+def interpolated(hub, days, **kwargs):
+    start, end = window(days)
+    return hub.dataview_interpolated_pd(
+        NAMESPACE, DATAVIEW, start, end, "00:01:00", **kwargs
+    )
+
+
+def stored(hub, days, **kwargs):
+    # one minute events of 8 fields: 8 times the rows of interpolated
+    start, end = window(max(1, days // 8))
+    return hub.dataview_stored_pd(NAMESPACE, DATAVIEW, start, end, **kwargs)
+
+
+def prefetched(hub, days):
+    hub.set_page_prefetch()
+    return interpolated(hub, days)
+
+
+def pages(hub, days):
+    start, end = window(days)
+    return sum(
+        len(page)
+        for page in hub.iter_dataview_pages(NAMESPACE, DATAVIEW, start, end, "00:01:00")
+    )
+
+
+def warm_cache(hub, days):
+    hub.enable_cache(tempfile.mkdtemp())
+    interpolated(hub, days)
+
+
+def several(hub, days):
+    start, end = window(days)
+    return hub.dataviews_interpolated_pd(
+        NAMESPACE, list(DATAVIEWS), start, end, "00:01:00"
+    )
+
+
+def downsampled(hub, days):
+    start, end = window(days)
+    return hub.dataview_downsampled_pd(
+        NAMESPACE, DATAVIEW, start, end, "00:01:00", points=1000, how="lttb"
+    )
+
+
+def downsampled_stored(hub, days):
+    # digital state fields have no numeric value: groups of missing values
+    start, end = window(max(1, days // 8))
+    df = hub.dataview_downsampled_pd(
+        NAMESPACE, DATAVIEW, start, end, points=1000, how="lttb", stored=True
+    )
+    assert len(df) > 0 and df["Value"].notna().all()
+    return df
+
+
+def streams(hub, days):
+    start, end = window(days)
+    ids = [stream["Id"] for stream in hub.iter_streams(NAMESPACE)][:200]
+    return hub.streams_window_pd(NAMESPACE, ids, start, end)
+
+
+def async_interpolated(hub, days):
+    from ocs_academic_hub.aio import AsyncHubClient
+
+    start, end = window(days)
+
+    async def read():
+        async with AsyncHubClient(hub) as client:
+            return await client.dataview_interpolated_pd(
+                NAMESPACE, DATAVIEW, start, end, "00:01:00"
+            )
+
+    return asyncio.run(read())
+
+
+PATHS = {
+    "interpolated": interpolated,
+    "interpolated parallel=4": lambda hub, days: interpolated(hub, days, parallel=4),
+    "interpolated compact": lambda hub, days: interpolated(hub, days, compact=True),
+    "interpolated arrow": lambda hub, days: interpolated(hub, days, engine="arrow"),
+    "interpolated prefetch": prefetched,
+    "stored": stored,
+    "stored parallel=4": lambda hub, days: stored(hub, days, parallel=4),
+    "iter_dataview_pages": pages,
+    "interpolated cached": interpolated,
+    "dataviews_interpolated_pd x3": several,
+    "downsampled lttb": downsampled,
+    "downsampled lttb stored": downsampled_stored,
+    "streams_window_pd x200": streams,
+    "async interpolated": async_interpolated,
+}
+# run before timing
+PREPARE = {"interpolated cached": warm_cache}
+
+
+def run_path(name, url, days, results):
+    os.environ["HUB_CACHE_DIR"] = tempfile.mkdtemp()
+    from ocs_academic_hub.datahub import hub_connect
+
+    hub = hub_connect({"id_token": "benchmark"}, url)
+    with contextlib.redirect_stdout(io.StringIO()):
+        if name in PREPARE:
+            PREPARE[name](hub, days)
+            hub.reset_stats()
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        value = PATHS[name](hub, days)
+        seconds = time.perf_counter() - start
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rows = value if isinstance(value, int) else len(value)
+    stats = hub.stats()
+    requests = stats.loc[stats["metric"] == "hub_requests_total", "value"].sum()
+    results.put(
+        {
+            "path": name,
+            "rows": rows,
+            "seconds": seconds,
+            "rows/sec": rows / seconds,
+            "requests": int(requests),
+            "peak RSS MB": rss / 1024,
+            "RSS growth MB": (rss - rss_before) / 1024,
+        }
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--row-latency", type=float, default=0.0)
+    for code in ["408", "409", "502"]:
+        parser.add_argument(f"--error-{code}", type=float, default=0.0)
+    parser.add_argument("--only", default="")
+    parser.add_argument("--save", default="")
+    parser.add_argument("--compare", default="")
+    args = parser.parse_args()
+
+    errors = {code: getattr(args, f"error_{code}") for code in ["408", "409", "502"]}
+    gateway = StandInGateway(
+        dataviews=DATAVIEWS,
+        latency=args.latency,
+        row_latency=args.row_latency,
+        errors={code: rate for code, rate in errors.items() if rate > 0},
+    ).start()
+    names = [n for n in PATHS if not args.only or n in args.only.split(",")]
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    rows = []
+    for name in names:
+        process = context.Process(
+            target=run_path, args=(name, gateway.url(), args.days, results)
+        )
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            print(f"@@ {name} failed (exit code {process.exitcode})")
+            continue
+        rows.append(results.get())
+    gateway.shutdown()
+
+    df = pd.DataFrame(rows).set_index("path")
+    print(
+        f"{args.days} days of 1 minute data, {args.latency * 1000:.0f} ms per request"
+    )
+    print(df.to_string(float_format="{:.1f}".format))
+    if args.save:
+        df.to_json(args.save, orient="index", indent=1)
+    if args.compare:
+        baseline = pd.read_json(args.compare, orient="index")
+        change = (df["rows/sec"] / baseline["rows/sec"] - 1) * 100
+        print("\nrows/sec change from baseline (%)")
+        print(change.dropna().round(1).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#
+# Gateway transport: bytes on the wire and pages/sec of interpolated pages
+# from the local stand-in gateway (benchmarks/gateway.py), for the previous
+# gql transport and HubTransport settings (compression, keep-alive, pool
+# size). Replies share a link of `mbps` Mbit/s (0: unlimited), like the
+# gateway seen from a lab, and each new connection takes `connect_ms` to set
+# up, like its TLS handshake.
+#
+#   python benchmarks/transport.py [pages] [rows] [threads] [mbps] [connect_ms]
+#
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from gateway import StandInGateway
+from gql.transport.requests import RequestsHTTPTransport
+
+from ocs_academic_hub.datahub import gql_document
+from ocs_academic_hub.queries import q_interpolated
+from ocs_academic_hub.transport import HubTransport, wire_bytes
+
+DATAVIEW = "sim.dataview"
+
+
+def transports(url, threads):
+    identity = {"Accept-Encoding": "identity"}
+    return {
+        "gql default (previous)": lambda: RequestsHTTPTransport(url, retries=3),
+        "identity, new connection": lambda: RequestsHTTPTransport(
+            url, headers={**identity, "Connection": "close"}
+        ),
+        "identity, keep-alive": lambda: HubTransport(
+            url, pool_size=threads, compress=False
+        ),
+        "gzip, keep-alive, pool 10": lambda: HubTransport(url, pool_size=10),
+        f"gzip, keep-alive, pool {threads}": lambda: HubTransport(
+            url, pool_size=threads
+        ),
+    }
+
+
+def run(name, url, pages, rows, threads, results):
+    transport = transports(url, threads)[name]()
+    document = gql_document(q_interpolated)
+    # the same page each time, of `rows` one minute rows
+    start = pd.Timestamp("2021-01-01")
+    variables = dict(
+        namespace="sim",
+        id=DATAVIEW,
+        startIndex=start.isoformat(),
+        endIndex=(start + pd.Timedelta(minutes=rows - 1)).isoformat(),
+        interpolation="00:01:00",
+        count=rows,
+    )
+    received = []
+    transport.session.hooks["response"].append(
+        lambda response, *args, **kwargs: received.append(wire_bytes(response))
+    )
+
+    def page(_):
+        result = transport.execute(document, variable_values=variables)
+        return len(result.data["dataview"][0]["data"]["data"])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        sizes = list(pool.map(page, range(pages)))
+    elapsed = time.perf_counter() - start
+    transport.close()
+    assert len(set(sizes)) == 1
+    results.put((pages / elapsed, sum(received) / pages, sizes[0]))
+
+
+def main(pages=200, rows=2000, threads=16, mbps=100, connect_ms=30):
+    gateway = StandInGateway(
+        dataviews={DATAVIEW: 8},
+        mbps=mbps,
+        connect_latency=connect_ms / 1000,
+        reuse_replies=True,
+    ).start()
+    # the client runs in its own process, the gateway threads do not hold its
+    # GIL
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    results = []
+    for name in transports(gateway.url(), threads):
+        gateway.connections = 0
+        process = context.Process(
+            target=run, args=(name, gateway.url(), pages, rows, threads, queue)
+        )
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            print(f"@@ {name} failed (exit code {process.exitcode})")
+            continue
+        results.append((name, *queue.get(), gateway.connections))
+    gateway.shutdown()
+
+    print(
+        f"{pages} interpolated pages of {rows} rows "
+        f"({results[0][3] / 1024:.0f} KiB of CSV), {threads} threads, "
+        f"{mbps or 'unlimited'} Mbit/s, {connect_ms} ms per new connection"
+    )
+    print(f"  {'transport':30} {'pages/sec':>10} {'KiB/page':>10} {'connections':>12}")
+    for name, rate, page_bytes, _, connections in results:
+        print(f"  {name:30} {rate:10.1f} {page_bytes / 1024:10.1f} {connections:12}")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:6]])
@@ -0,0 +1,414 @@
+#
+import asyncio
+import time
+
+import pandas as pd
+from typeguard import typechecked
+
+from .datahub import (
+    UXIE_CONSTANT,
+    GraphQLException,
+    check_dataview_args,
+    check_namespace_reply,
+    concat_pages,
+    gateway_error_kind,
+    get_streams_args,
+    index_string,
+    interval_timedelta,
+    parse_interpolated_page,
+    parse_stored_page,
+    process_digital_states,
+    remap_campus_dataview_id,
+    stream_exception,
+    stream_interpolated_count,
+    stream_interpolated_frame,
+    stream_queries,
+    stream_window_frame,
+)
+from .paging import MIN_PAGE_COUNT, PageSizer, page_size_key
+from .queries import *
+from .util import HubException, hub_authenticated
+
+DEFAULT_MAX_CONCURRENCY = 16
+
+
+class AsyncHubClient:
+    """asyncio client for the Hub GraphQL gateway, sharing the login (JWT and
+    gateway URL) of a `HubClient` from `hub_login()` or `hub_connect()`.
+
+    All requests of a client go through one semaphore of `max_concurrency`
+    slots, so a whole dataset can be requested at once with asyncio.gather."""
+
+    @typechecked
+    def __init__(self, hub, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        try:
+            import aiohttp  # noqa: F401
+        except ImportError:
+            raise HubException(
+                "@@ AsyncHubClient requires aiohttp (pip install aiohttp)"
+            ) from None
+        self.__hub = hub
+        self.__max_concurrency = max_concurrency
+        self.__semaphore = None
+        self.__session = None
+
+    def authenticated(self) -> bool:
+        return self.__hub.authenticated()
+
+    def hub(self):
+        return self.__hub
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
+
+    def __get_session(self):
+        import aiohttp
+
+        # created on first use, so both belong to the running event loop
+        if self.__session is None or self.__session.closed:
+            options = self.__hub.transport_options()
+            self.__session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.__max_concurrency, ssl=False),
+                timeout=aiohttp.ClientTimeout(
+                    sock_connect=options["connect_timeout"],
+                    sock_read=options["read_timeout"],
+                ),
+                headers={
+                    "Accept-Encoding": "gzip, deflate"
+                    if options["compress"]
+                    else "identity"
+                },
+            )
+            self.__semaphore = asyncio.Semaphore(self.__max_concurrency)
+        return self.__session
+
+    async def graphql_query(self, query_string, variable_values=None):
+        session = self.__get_session()
+        payload = {"query": query_string}
+        if variable_values:
+            payload["variables"] = variable_values
+        headers = {"Authorization": f"Bearer {self.__hub._id_token()}"}
+        async with self.__semaphore:
+            async with session.post(
+                self.__hub.gateway_url(), json=payload, headers=headers
+            ) as response:
+                body = await response.read()
+                metrics = self.__hub.metrics()
+                metrics.inc("hub_requests_total", status=response.status)
+                metrics.inc("hub_response_bytes_total", len(body))
+                try:
+                    result = await response.json(content_type=None)
+                    if not isinstance(result, dict):
+                        raise ValueError
+                except ValueError:
+                    result = {}
+                if "errors" not in result and "data" not in result:
+                    response.raise_for_status()
+                    raise GraphQLException("Server did not return a GraphQL result")
+        # same exception as gql.Client.execute, for the error handling below
+        if result.get("errors"):
+            raise Exception(str(result["errors"][0]))
+        return result["data"]
+
+    async def dataview_columns(self, namespace_id: str, dataview_id: str):
+        # shares the resolved data items cached by the HubClient
+        definitions = self.__hub.definition_cache()
+        query_ids = ["Asset_value", "Asset_digital"]
+        cached = [definitions.get(namespace_id, dataview_id, q) for q in query_ids]
+        missing = [q for q, items in zip(query_ids, cached) if items is None]
+        replies = await asyncio.gather(
+            *[
+                self.graphql_query(
+                    q_resolved,
+                    {"id": dataview_id, "namespace": namespace_id, "queryId": query_id},
+                )
+                for query_id in missing
+            ]
+        )
+        for query_id, reply in zip(missing, replies):
+            if len(reply["dataview"]) == 0:
+                raise HubException(
+                    f"@@ Bad namespace ({namespace_id}) and/or dataview ID ({dataview_id})"
+                )
+            items = reply["dataview"][0]["resolvedDataItems"]["Items"]
+            definitions.put(namespace_id, dataview_id, query_id, items)
+            cached[query_ids.index(query_id)] = items
+        return sum(len(items) for items in cached) + 1
+
+    async def __get_data(
+        self,
+        namespace_id,
+        dataview_id,
+        start_index,
+        end_index,
+        interval,
+        count,
+        stored,
+        next_page,
+    ):
+        variables = dict(
+            namespace=namespace_id,
+            id=dataview_id,
+            startIndex=start_index,
+            endIndex=end_index,
+            nextPage=next_page,
+            count=count,
+        )
+        if not stored:
+            variables["interpolation"] = interval
+        reply = await self.graphql_query(
+            q_stored if stored else q_interpolated, variables
+        )
+        if len(reply["dataview"]) == 0:
+            print("@@ NO DATA: Check namespace_id, dataview_id and/or date range")
+            return None, []
+        result = reply["dataview"][0]["data"]
+        return result["nextPage"], result["data"]
+
+    @hub_authenticated
+    async def iter_dataview_pages(
+        self,
+        namespace_id: str,
+        dataview_id: str,
+        start_index: str,
+        end_index: str,
+        interval: str = "",
+        count: int = 0,
+        sub_second_interval: bool = False,
+        stored: bool = False,
+    ):
+        """Asynchronously yield one DataFrame per dataview data page"""
+        error = check_dataview_args(
+            start_index, end_index, interval, sub_second_interval, stored
+        )
+        if error:
+            raise HubException(f"@Error: {error}")
+        dataview_id = remap_campus_dataview_id(dataview_id)
+        loop = asyncio.get_running_loop()
+        metrics = self.__hub.metrics()
+        mode = "stored" if stored else "interpolated"
+        sizer = PageSizer(page_size_key(namespace_id, dataview_id, stored), count)
+        count = sizer.count
+
+        next_page = None
+        delay_50x = 1
+        last_timestamp = None
+        page_rows = 0
+        while True:
+            start_time = time.perf_counter()
+            try:
+                next_page, csv_or_json = await self.__get_data(
+                    namespace_id,
+                    dataview_id,
+                    start_index,
+                    end_index,
+                    interval,
+                    count,
+                    stored,
+                    next_page,
+                )
+            except Exception as e:
+                kind = gateway_error_kind(e)
+                if kind is None:
+                    raise e
+                if kind == "unauthenticated":
+                    self.__hub.set_authenticated(False)
+                    raise GraphQLException(
+                        "@@@ Please (re)start Hub login sequence (cell with hub_login() )"
+                    )
+                if kind == "409":
+                    metrics.inc("hub_retries_total", status=kind)
+                    continue
+                if kind == "502":
+                    await asyncio.sleep(delay_50x)
+                    delay_50x *= 2
+                    if delay_50x > 8:
+                        metrics.inc("hub_errors_total", status=kind)
+                        raise e
+                    metrics.inc("hub_retries_total", status=kind)
+                    continue
+                if kind != "408":
+                    metrics.inc("hub_errors_total", status=kind)
+                    raise GraphQLException(f"Got: {str(e)}")
+
+                # same restart rules as HubClient: the page which timed out
+                # again, smaller
+                if sizer.count == 0:
+                    sizer.start(
+                        await self.__page_count_estimate(
+                            namespace_id, dataview_id, page_rows
+                        )
+                    )
+                count = sizer.timeout()
+                if count < MIN_PAGE_COUNT:
+                    metrics.inc("hub_errors_total", status=kind)
+                    raise e
+                metrics.inc("hub_retries_total", status=kind)
+                metrics.inc("hub_page_size_changes_total", direction="down")
+                if not stored:
+                    next_page = None
+                    if last_timestamp is not None:
+                        start_index = index_string(
+                            last_timestamp + interval_timedelta(interval)
+                        )
+                continue
+
+            metrics.observe(
+                "hub_page_seconds", time.perf_counter() - start_time, mode=mode
+            )
+            if len(csv_or_json) > 0:
+                # parsing is CPU bound, keep the event loop serving other requests
+                page = await loop.run_in_executor(
+                    None,
+                    parse_stored_page if stored else parse_interpolated_page,
+                    csv_or_json,
+                )
+                metrics.inc("hub_page_rows_total", len(page), mode=mode)
+                page_rows = max(page_rows, len(page))
+                grown = next_page is not None and sizer.success(len(page))
+                if grown:
+                    metrics.inc("hub_page_size_changes_total", direction="up")
+                if len(page) > 0:
+                    last_timestamp = page["Timestamp"].iloc[-1]
+                    yield process_digital_states(page)
+                if grown:
+                    count = sizer.count
+                    if not stored:
+                        next_page = None
+                        start_index = index_string(
+                            last_timestamp + interval_timedelta(interval)
+                        )
+                    continue
+
+            if next_page is None:
+                break
+        sizer.finish()
+
+    async def __page_count_estimate(self, namespace_id, dataview_id, page_rows):
+        if page_rows > 0:
+            return page_rows
+        width = self.__hub.catalog().dataview_width(dataview_id)
+        if width is None:
+            width = await self.dataview_columns(namespace_id, dataview_id)
+        return UXIE_CONSTANT // width
+
+    async def __dataview_pd(self, *args, **kwargs):
+        pages = []
+        async for page in self.iter_dataview_pages(*args, **kwargs):
+            pages.append(page)
+        return concat_pages(pages)
+
+    @hub_authenticated
+    @typechecked
+    async def dataview_interpolated_pd(
+        self,
+        namespace_id: str,
+        dataview_id: str,
+        start_index: str,
+        end_index: str,
+        interval: str,
+        count: int = 0,
+        sub_second_interval: bool = False,
+    ):
+        return await self.__dataview_pd(
+            namespace_id,
+            dataview_id,
+            start_index,
+            end_index,
+            interval,
+            count,
+            sub_second_interval,
+        )
+
+    @hub_authenticated
+    @typechecked
+    async def dataview_stored_pd(
+        self,
+        namespace_id: str,
+        dataview_id: str,
+        start_index: str,
+        end_index: str,
+        count: int = 0,
+    ):
+        try:
+            return await self.__dataview_pd(
+                namespace_id,
+                dataview_id,
+                start_index,
+                end_index,
+                "",
+                count,
+                stored=True,
+            )
+        except GraphQLException as e:
+            raise e
+        except Exception as e:
+            if "404" in str(e):
+                print(
+                    f"### Error: data view with Id {dataview_id} has no version for stored data.\n"
+                    "###  If data view id is correct, contact Hub support if stored data is required instead of "
+                    "interpolated. "
+                )
+                return
+            raise e
+
+    async def __stream_ops(self, kind, namespace, stream_id="", extra_args=None):
+        q_values = dict(namespace=namespace, stream_id=stream_id)
+        if extra_args:
+            q_values.update(extra_args)
+        try:
+            reply = await self.graphql_query(stream_queries[kind], q_values)
+        except Exception as e:
+            raise stream_exception(e) from None
+        return check_namespace_reply(reply, namespace)
+
+    @hub_authenticated
+    @typechecked
+    async def get_streams(
+        self, namespace: str, query: str = "", count: int = 0, skip: int = 0
+    ):
+        reply = await self.__stream_ops(
+            "streams", namespace, "", get_streams_args(query, count, skip)
+        )
+        return reply["namespaces"][0]["streams"]
+
+    @hub_authenticated
+    @typechecked
+    async def stream_window_pd(
+        self, namespace: str, stream_id, start: str, end: str, column_name: str = ""
+    ):
+        reply = await self.__stream_ops(
+            "data", namespace, stream_id, dict(start=start, end=end)
+        )
+        return stream_window_frame(reply["namespaces"][0]["data"], column_name)
+
+    @hub_authenticated
+    @typechecked
+    async def stream_interpolated_pd(
+        self,
+        namespace: str,
+        stream_id,
+        start: str,
+        end: str,
+        interval: str,
+        column_name: str = "",
+        raw: bool = False,
+    ):
+        count = stream_interpolated_count(start, end, interval)
+        reply = await self.__stream_ops(
+            "interpolated",
+            namespace,
+            stream_id,
+            dict(start=start, end=end, count=count),
+        )
+        return stream_interpolated_frame(
+            reply["namespaces"][0]["data"], column_name, raw
+        )
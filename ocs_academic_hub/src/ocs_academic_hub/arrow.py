@@ -0,0 +1,127 @@
+#
+import io
+
+import pandas as pd
+
+from .cache import split_mixed_columns
+from .util import HubException
+
+ENGINES = ["pandas", "arrow", "arrow-pandas"]
+# for Table.drop_columns and concat_tables(promote_options=...)
+MIN_PYARROW = 14
+# pages are split in blocks of this size, parsed by the Arrow thread pool
+ARROW_BLOCK_SIZE = 256 * 1024
+
+
+def check_engine(engine):
+    if engine not in ENGINES:
+        raise HubException(f"@@ engine must be one of {ENGINES}, got {engine}")
+    if engine == "pandas":
+        return
+    try:
+        import pyarrow
+    except ImportError:
+        raise HubException(
+            f'@@ engine="{engine}" requires pyarrow (pip install pyarrow)'
+        ) from None
+    if int(pyarrow.__version__.split(".")[0]) < MIN_PYARROW:
+        raise HubException(
+            f'@@ engine="{engine}" requires pyarrow >= {MIN_PYARROW}, '
+            f"found {pyarrow.__version__} (pip install -U pyarrow)"
+        )
+    if engine == "arrow-pandas" and not hasattr(pd, "ArrowDtype"):
+        raise HubException(
+            f'@@ engine="{engine}" requires pandas >= 1.5, found {pd.__version__}'
+        )
+
+
+def arrow_column_types(stream_types, compact=False):
+    """Arrow types of the interpolated columns from their Stream_Type (see
+    dataview_definition), the other columns are inferred"""
+    import pyarrow as pa
+
+    arrow_types = {
+        "Float": pa.float32() if compact else pa.float64(),
+        "Integer": pa.int64(),
+        "String": pa.string(),
+        "Timestamp": pa.timestamp("ns", tz="UTC"),
+    }
+    column_types = {"Timestamp": pa.timestamp("ns", tz="UTC")}
+    for column, stream_type in stream_types.items():
+        if stream_type in arrow_types:
+            column_types[column] = arrow_types[stream_type]
+    return column_types
+
+
+def parse_interpolated_table(csv, column_types):
+    """Interpolated page CSV as a pyarrow.Table, parsed by several threads"""
+    import pyarrow as pa
+    import pyarrow.csv
+
+    table = pa.csv.read_csv(
+        io.BytesIO(csv.encode("utf-8")),
+        read_options=pa.csv.ReadOptions(use_threads=True, block_size=ARROW_BLOCK_SIZE),
+        convert_options=pa.csv.ConvertOptions(column_types=column_types),
+    )
+    return process_digital_states_table(table)
+
+
+def process_digital_states_table(table):
+    # as process_digital_states: state names replace the values, blank when
+    # there is no value
+    import pyarrow.compute as pc
+
+    for ds_column in [c for c in table.column_names if c[-4:] == "__ds"]:
+        column = ds_column[:-4]
+        states = table[ds_column].cast("string")
+        if column in table.column_names:
+            states = pc.if_else(pc.is_valid(table[column]), states, "")
+            table = table.drop_columns([column])
+        i = table.column_names.index(ds_column)
+        table = table.set_column(i, column, states)
+    return table
+
+
+def page_last_timestamp(page):
+    if isinstance(page, pd.DataFrame):
+        return page["Timestamp"].iloc[-1]
+    return pd.Timestamp(page["Timestamp"][-1].as_py())
+
+
+def rows_before(page, before):
+    if isinstance(page, pd.DataFrame):
+        return page[page["Timestamp"] < before]
+    import pyarrow.compute as pc
+
+    return page.filter(pc.less(page["Timestamp"], before))
+
+
+def concat_tables(tables):
+    """One table over the chunks of all `tables`: no copy when their schemas
+    match (a column inferred as null or int in one page is promoted)"""
+    import pyarrow as pa
+
+    tables = [table for table in tables if table.num_columns > 0]
+    if len(tables) == 0:
+        return pa.table({})
+    if all(table.schema == tables[0].schema for table in tables):
+        return pa.concat_tables(tables)
+    return pa.concat_tables(tables, promote_options="permissive")
+
+
+def to_engine(df, engine):
+    """Result of a dataview read for `engine`: a DataFrame, a pyarrow.Table
+    or a DataFrame of Arrow backed columns"""
+    if engine == "pandas":
+        return df if isinstance(df, pd.DataFrame) else df.to_pandas()
+    import pyarrow as pa
+
+    table = df
+    if isinstance(df, pd.DataFrame):
+        # as in the dataview cache, stored values mixed with digital state
+        # names are split in a numeric column and a `|text` one
+        df, _ = split_mixed_columns(df)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    if engine == "arrow":
+        return table
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
@@ -0,0 +1,331 @@
+#
+import contextlib
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+from .util import HubException
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    import msvcrt
+
+    fcntl = None
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "HUB_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "ocs_academic_hub"),
+)
+# the dataview cache has its own folder: the cache folder also holds the
+# catalog, stream catalogs and dataset snapshots
+DATAVIEW_CACHE_DIR = os.path.join(DEFAULT_CACHE_DIR, "dataviews")
+DEFAULT_CACHE_MB = 1024
+# resolved data items of a dataview change only when it is edited
+DEFAULT_DEFINITION_TTL = 15 * 60
+
+INDEX_FILE = "index.json"
+ENTRY_NAME = re.compile(r"^[0-9a-f]{40}$")
+LOCK_SUFFIX = ".lock"
+TEXT_SUFFIX = "|text"
+
+
+def _write_json(path, content):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(json.dumps(content, indent=1))
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def split_mixed_columns(df, columns=()):
+    """Parquet columns have one type: numbers mixed with digital state strings
+    (stored `Value` column) are kept as a numeric and a text column. The
+    columns in `columns` are split even when not mixed in `df`."""
+    mixed = []
+    for column in df.columns:
+        if df[column].dtype != object and column not in columns:
+            continue
+        numbers = pd.to_numeric(df[column], errors="coerce")
+        is_text = numbers.isna() & df[column].notna()
+        if column in columns or (is_text.any() and not is_text.all()):
+            text = df[column].astype(object).where(is_text, None)
+            df = df.assign(**{column: numbers, column + TEXT_SUFFIX: text})
+            mixed.append(column)
+    return df, mixed
+
+
+def join_mixed_columns(df, mixed):
+    for column in mixed:
+        text = df.pop(column + TEXT_SUFFIX)
+        df[column] = text.where(text.notna(), df[column].astype(object))
+    return df
+
+
+def missing_ranges(covered, start, end, step):
+    """Sub-ranges of [start, end] not in the union of `covered` closed ranges.
+    With a non-zero `step` (interpolated grid), ranges are on the grid and
+    neighbours one step apart are contiguous."""
+    missing = []
+    cursor, cursor_covered = start, False
+    for range_start, range_end in sorted(covered):
+        if range_end < cursor or range_start > end:
+            continue
+        if range_start > cursor:
+            missing.append((cursor, range_start - step))
+        cursor, cursor_covered = range_end + step, not step
+    if cursor < end or (cursor == end and not cursor_covered):
+        missing.append((cursor, end))
+    return missing
+
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """Exclusive lock on `path` between processes, released by the system when
+    the process holding it dies"""
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _remove_orphans(entry_dir, index):
+    """Remove segment files left out of the index (kernel killed while storing)
+    and return minus their size"""
+    files = set(segment["file"] for segment in index["segments"])
+    removed = 0
+    for file in os.listdir(entry_dir):
+        if file.endswith(".parquet") and file not in files:
+            path = os.path.join(entry_dir, file)
+            try:
+                removed -= os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                pass
+    return removed
+
+
+def _covered_rows(frames):
+    """Rows of the (start, end, df) segments, the rows at a time covered by
+    several segments only once: stored events sharing a timestamp are kept"""
+    last_end = None
+    for segment_start, segment_end, df in sorted(frames, key=lambda f: f[0]):
+        if last_end is not None and "Timestamp" in df.columns:
+            if segment_end <= last_end:
+                continue
+            if segment_start <= last_end:
+                df = df[df["Timestamp"] > last_end]
+        last_end = segment_end if last_end is None else max(last_end, segment_end)
+        yield df
+
+
+class DataviewCache:
+    """Parquet segments of dataview results under `directory`, one folder per
+    (namespace, dataview, mode, interval) with an index of the time ranges
+    covered by each segment. Segments are evicted least recently used first
+    once the cache grows over `max_mb`. An index is only changed while
+    holding its lock file, so kernels sharing the cache keep each other's
+    segments."""
+
+    def __init__(self, directory=DATAVIEW_CACHE_DIR, max_mb=DEFAULT_CACHE_MB):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HubException(
+                "@@ Dataview cache requires pyarrow (pip install pyarrow)"
+            ) from None
+        self.directory = directory
+        self.max_bytes = max_mb * 1024 * 1024
+        self.__lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # bytes stored, as of the last scan plus the segments stored since
+        self.__bytes = 0
+        self.__evict()
+
+    @staticmethod
+    def key(namespace_id, dataview_id, stored, interval="", phase=0):
+        mode = "stored" if stored else "interpolated"
+        return f"{namespace_id}|{dataview_id}|{mode}|{interval}|{phase}"
+
+    def __entry_dir(self, key):
+        return os.path.join(
+            self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest()
+        )
+
+    def __entries(self):
+        # only the entry folders: `directory` may be shared with other files
+        return [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if ENTRY_NAME.match(name)
+            and os.path.isfile(os.path.join(self.directory, name, INDEX_FILE))
+        ]
+
+    def __load_index(self, key, version):
+        entry_dir = self.__entry_dir(key)
+        index = _read_json(os.path.join(entry_dir, INDEX_FILE))
+        if index is not None and index["version"] != version:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            index = None
+        if index is None:
+            index = {"key": key, "version": version, "segments": []}
+        return entry_dir, index
+
+    def lookup(self, key, version, start, end, step=pd.Timedelta(0)):
+        """Return (cached rows within [start, end], missing sub-ranges)"""
+        with self.__lock, _file_lock(self.__entry_dir(key) + LOCK_SUFFIX):
+            entry_dir, index = self.__load_index(key, version)
+            frames = []
+            segments = []
+            now = time.time()
+            for segment in index["segments"]:
+                segment_start = pd.Timestamp(segment["start"])
+                segment_end = pd.Timestamp(segment["end"])
+                if segment_end >= start and segment_start <= end:
+                    try:
+                        df = pd.read_parquet(os.path.join(entry_dir, segment["file"]))
+                        df = join_mixed_columns(df, segment["mixed"])
+                    except (OSError, ValueError):
+                        # evicted by another kernel
+                        continue
+                    frames.append((segment_start, segment_end, df))
+                    segment["last_access"] = now
+                segments.append(segment)
+            index["segments"] = segments
+            if len(frames) > 0:
+                _write_json(os.path.join(entry_dir, INDEX_FILE), index)
+            covered = [
+                (pd.Timestamp(s["start"]), pd.Timestamp(s["end"]))
+                for s in index["segments"]
+            ]
+
+        missing = missing_ranges(covered, start, end, step)
+        if len(frames) == 0:
+            return None, missing
+        df = pd.concat(_covered_rows(frames), ignore_index=True, sort=False)
+        if "Timestamp" in df.columns:
+            df = df[(df["Timestamp"] >= start) & (df["Timestamp"] <= end)]
+        return df, missing
+
+    def store(self, key, version, start, end, df):
+        entry_dir = self.__entry_dir(key)
+        with self.__lock, _file_lock(entry_dir + LOCK_SUFFIX):
+            entry_dir, index = self.__load_index(key, version)
+            os.makedirs(entry_dir, exist_ok=True)
+            file = f"{uuid.uuid4().hex}.parquet"
+            path = os.path.join(entry_dir, file)
+            df, mixed = split_mixed_columns(df)
+            df.to_parquet(path, index=False)
+            index["segments"].append(
+                {
+                    "file": file,
+                    "mixed": mixed,
+                    "start": start.isoformat(),
+                    "end": end.isoformat(),
+                    "bytes": os.path.getsize(path),
+                    "last_access": time.time(),
+                }
+            )
+            _write_json(os.path.join(entry_dir, INDEX_FILE), index)
+            self.__bytes += index["segments"][-1]["bytes"] + _remove_orphans(
+                entry_dir, index
+            )
+            if self.__bytes > self.max_bytes:
+                self.__evict()
+
+    def __evict(self):
+        # other kernels store segments too: the whole cache is scanned, then
+        # each index is changed under its lock
+        segments = sorted(
+            (
+                (entry_dir, segment)
+                for entry_dir in self.__entries()
+                for segment in (
+                    _read_json(os.path.join(entry_dir, INDEX_FILE)) or {"segments": []}
+                )["segments"]
+            ),
+            key=lambda item: item[1]["last_access"],
+        )
+        self.__bytes = sum(segment["bytes"] for _, segment in segments)
+        for entry_dir, segment in segments:
+            if self.__bytes <= self.max_bytes:
+                break
+            with _file_lock(entry_dir + LOCK_SUFFIX):
+                index = _read_json(os.path.join(entry_dir, INDEX_FILE))
+                if index is None:
+                    continue
+                files = [s["file"] for s in index["segments"]]
+                if segment["file"] in files:
+                    del index["segments"][files.index(segment["file"])]
+                    _write_json(os.path.join(entry_dir, INDEX_FILE), index)
+                try:
+                    os.remove(os.path.join(entry_dir, segment["file"]))
+                except OSError:
+                    pass
+            self.__bytes -= segment["bytes"]
+
+    def size(self):
+        total = 0
+        for entry_dir in self.__entries():
+            index = _read_json(os.path.join(entry_dir, INDEX_FILE))
+            if index is not None:
+                total += sum(segment["bytes"] for segment in index["segments"])
+        return total
+
+    def clear(self):
+        with self.__lock:
+            for entry_dir in self.__entries():
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            self.__bytes = 0
+
+
+class DefinitionCache:
+    """Resolved data items of dataviews in memory, per (namespace, dataview,
+    queryId), kept `ttl` seconds (0: not kept)"""
+
+    def __init__(self, ttl=DEFAULT_DEFINITION_TTL):
+        self.ttl = ttl
+        self.__items = {}
+        self.__lock = threading.Lock()
+
+    def get(self, namespace_id, dataview_id, query_id):
+        with self.__lock:
+            entry = self.__items.get((namespace_id, dataview_id, query_id))
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def put(self, namespace_id, dataview_id, query_id, items):
+        if self.ttl > 0:
+            with self.__lock:
+                self.__items[(namespace_id, dataview_id, query_id)] = (
+                    time.monotonic(),
+                    items,
+                )
+
+    def clear(self):
+        with self.__lock:
+            self.__items.clear()
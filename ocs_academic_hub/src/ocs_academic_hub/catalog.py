@@ -0,0 +1,347 @@
+#
+import ast
+import hashlib
+import json
+import os
+import pickle
+import threading
+import uuid
+from math import nan
+
+import pandas as pd
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from .cache import DEFAULT_CACHE_DIR, _read_json, _write_json
+
+SNAPSHOT_DIR = os.path.join(DEFAULT_CACHE_DIR, "catalog")
+SNAPSHOT_VERSION = 1
+NGRAM = 3
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def asset_id_fix(gqlh):
+    for i, database in enumerate(gqlh["Database"]):
+        for j, asset in enumerate(database["asset_with_dv"]):
+            if asset.get("asset_id", None) is None:
+                asset["asset_id"] = asset["name"]
+            else:
+                asset["name"] = asset["asset_id"]
+    return gqlh
+
+
+def assets_and_metadata(gqlh, db_index, current_db):
+    assets_info = gqlh["Database"][db_index[current_db]]["asset_with_dv"]
+    asset_key = "name"
+    assets = sorted([i[asset_key].lower() for i in assets_info])
+    dv_column_key = {}
+    for i in assets_info:
+        for dv in i["has_dataview"]:
+            dv_column_key[dv["id"]] = dv.get("ocs_column_key", None)
+
+    def metaf(x):
+        return {} if x is None else eval(x, {"nan": nan})
+
+    metadata = {
+        assets_info[j][asset_key]: metaf(assets_info[j]["asset_metadata"])
+        for j in range(len(assets_info))
+    }
+    for key in metadata.keys():
+        d = metadata[key]
+        d.update({"Asset_Id": key})
+    return assets, metadata, dv_column_key
+
+
+def ngrams(text):
+    return {text[i : i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+class DatasetIndex:
+    """Lookup structures of one dataset (asset database) of the catalog"""
+
+    def __init__(self, gqlh, db_index, asset_db):
+        self.database = gqlh["Database"][db_index[asset_db]]
+        self.assets, self.metadata, self.dv_column_key = assets_and_metadata(
+            gqlh, db_index, asset_db
+        )
+        assets_info = self.database["asset_with_dv"]
+
+        # case-folded asset id -> asset id, as in the catalog
+        self.asset_map = {}
+        # case-folded asset id -> ids of its dataviews covering that asset
+        self.asset_dataviews = {}
+        # dataview id -> text matched by the filter of asset_dataviews()
+        self.dataview_text = {}
+        self.single_asset = set()
+        self.multiple_asset = set()
+        for asset in assets_info:
+            name = asset["name"].lower()
+            self.asset_map.setdefault(name, asset["name"])
+            dataview_ids = []
+            for dv in asset["has_dataview"]:
+                asset_ids = [i.lower() for i in dv["asset_id"]]
+                if name in asset_ids:
+                    dataview_ids.append(dv["id"])
+                self.dataview_text[
+                    dv["id"]
+                ] = f"{dv['id']}\0{dv['description'].lower()}"
+                if len(asset_ids) == 1:
+                    self.single_asset.add(dv["id"])
+                elif len(asset_ids) > 1:
+                    self.multiple_asset.add(dv["id"])
+            self.asset_dataviews.setdefault(name, frozenset(dataview_ids))
+
+        self.ngram_index = {}
+        for dataview_id, text in self.dataview_text.items():
+            for ngram in ngrams(text):
+                self.ngram_index.setdefault(ngram, set()).add(dataview_id)
+
+        descriptions = {i["name"]: i["description"] for i in assets_info}
+        self.asset_frame = pd.DataFrame(
+            {
+                "Asset_Id": sorted(descriptions.keys()),
+                "Description": [descriptions[i] for i in sorted(descriptions.keys())],
+            }
+        )
+        self.asset_frame_key = self.asset_frame["Asset_Id"].str.lower()
+
+    def find_assets(self, filter=""):
+        if not filter:
+            return self.asset_frame.copy()
+        selected = self.asset_frame_key.str.contains(filter.lower(), regex=False)
+        return self.asset_frame[selected].reset_index(drop=True)
+
+    def find_dataviews(self, filter="", asset="", multiple_asset=False):
+        """Sorted ids of dataviews whose id or description contains `filter`"""
+        candidates = self.multiple_asset if multiple_asset else self.single_asset
+        if asset:
+            candidates = candidates & self.asset_dataviews.get(asset.lower(), set())
+        filter = filter.lower()
+        if len(filter) >= NGRAM:
+            for ngram in ngrams(filter):
+                candidates = candidates & self.ngram_index.get(ngram, set())
+                if len(candidates) == 0:
+                    break
+        if filter:
+            candidates = [i for i in candidates if filter in self.dataview_text[i]]
+        return sorted(candidates)
+
+
+class HubCatalog:
+    """Parsed dataset catalog (hub_datasets.json), shared by all clients of
+    the process. Dataset indexes are built the first time they are used."""
+
+    def __init__(self, gqlh):
+        self.gqlh = asset_id_fix(gqlh)
+        self.db_index = CaseInsensitiveDict({})
+        self.namespaces = CaseInsensitiveDict({})
+        for i, database in enumerate(self.gqlh["Database"]):
+            self.db_index[database["asset_db"]] = i
+            self.namespaces[database["name"]] = database["namespace"]
+        self.__datasets = {}
+        # asset_db -> {dataview id: number of columns}
+        self.__widths = {}
+        self.__lock = threading.Lock()
+
+    def first_db(self):
+        return self.gqlh["Database"][0]["asset_db"]
+
+    def dataset(self, asset_db):
+        index = self.__datasets.get(asset_db.lower(), None)
+        if index is None:
+            with self.__lock:
+                index = self.__datasets.get(asset_db.lower(), None)
+                if index is None:
+                    index = DatasetIndex(self.gqlh, self.db_index, asset_db)
+                    self.__datasets[asset_db.lower()] = index
+        return index
+
+    def dataview_width(self, dataview_id):
+        """Number of columns of a dataview, Timestamp included (None: unknown)"""
+        for database in self.gqlh["Database"]:
+            key = database["asset_db"].lower()
+            if key not in self.__widths:
+                self.__widths[key] = database_widths(database)
+            if dataview_id in self.__widths[key]:
+                return self.__widths[key][dataview_id]
+        return None
+
+    def versions(self):
+        """Database id -> what tells a new version of it"""
+        return {
+            database["id"]: version_key(database) for database in self.gqlh["Database"]
+        }
+
+    def merged(self, versions, databases):
+        """Catalog with the databases listed in `versions` (in that order),
+        taken from `databases` when there, else from this catalog. Indexes of
+        the unchanged datasets are kept."""
+        current = {database["id"]: database for database in self.gqlh["Database"]}
+        fetched = {database["id"]: database for database in databases}
+        databases = [
+            fetched.get(version["id"], current.get(version["id"]))
+            for version in versions
+        ]
+        catalog = HubCatalog(
+            {"Database": [database for database in databases if database is not None]}
+        )
+        for database in catalog.gqlh["Database"]:
+            if current.get(database["id"]) is not database:
+                continue
+            key = database["asset_db"].lower()
+            if key in self.__datasets:
+                catalog.__datasets[key] = self.__datasets[key]
+            if key in self.__widths:
+                catalog.__widths[key] = self.__widths[key]
+        return catalog
+
+
+def version_key(database):
+    return [
+        database.get(field) for field in ["version", "name", "asset_db", "namespace"]
+    ]
+
+
+def database_widths(database):
+    widths = {}
+    for asset in database["asset_with_dv"]:
+        for dv in asset["has_dataview"]:
+            try:
+                widths[dv["id"]] = len(ast.literal_eval(dv["columns"])) + 1
+            except (KeyError, TypeError, ValueError, SyntaxError):
+                continue
+    return widths
+
+
+def _snapshot_path(data_file):
+    name = hashlib.sha1(os.path.abspath(data_file).encode("utf-8")).hexdigest()
+    return os.path.join(SNAPSHOT_DIR, f"{name}.pickle")
+
+
+def _read_snapshot(path, stamp, source=None):
+    """Parsed catalog from the snapshot at `path` if it was made from the same
+    JSON source: same (size, mtime) stamp, or else same content checksum"""
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+        if snapshot["version"] != SNAPSHOT_VERSION:
+            return None
+        if snapshot["stamp"] == stamp:
+            return snapshot["gqlh"]
+        if source is not None and snapshot["checksum"] == _checksum(source):
+            return snapshot["gqlh"]
+    except Exception:
+        pass
+    return None
+
+
+def _write_snapshot(path, stamp, source, gqlh):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            pickle.dump(
+                {
+                    "version": SNAPSHOT_VERSION,
+                    "stamp": stamp,
+                    "checksum": _checksum(source),
+                    "gqlh": gqlh,
+                },
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp_path, path)
+    except OSError:
+        # read-only home or disk full: the snapshot is only a speedup
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def _checksum(source):
+    return hashlib.sha256(source).hexdigest()
+
+
+def _file_stamp(data_file):
+    stat = os.stat(data_file)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _parse_catalog(data_file, stamp, snapshot):
+    path = _snapshot_path(data_file)
+    if snapshot:
+        gqlh = _read_snapshot(path, stamp)
+        if gqlh is not None:
+            return gqlh
+    with open(data_file, "rb") as f:
+        source = f.read()
+    if snapshot:
+        gqlh = _read_snapshot(path, stamp, source)
+        if gqlh is not None:
+            # same content, new file (reinstall): refresh the stamp
+            _write_snapshot(path, stamp, source, gqlh)
+            return gqlh
+    gqlh = json.loads(source)
+    if snapshot:
+        _write_snapshot(path, stamp, source, gqlh)
+    return gqlh
+
+
+def save_catalog(data_file, catalog, snapshot=True):
+    """Write `catalog` to `data_file` and make it the catalog of that file for
+    the process, without parsing the file again"""
+    source = json.dumps(catalog.gqlh, indent=2).encode("utf-8")
+    tmp_path = f"{data_file}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(source)
+    os.replace(tmp_path, data_file)
+    stamp = _file_stamp(data_file)
+    if snapshot:
+        _write_snapshot(_snapshot_path(data_file), stamp, source, catalog.gqlh)
+    with _catalogs_lock:
+        _catalogs[os.path.abspath(data_file)] = (stamp, catalog)
+
+
+def download_catalog(url, data_file):
+    """Conditional GET of a catalog file: the download is skipped (304) when
+    the ETag or Last-Modified of the copy at `data_file` is still current.
+    Returns the HTTP status."""
+    validators_file = f"{data_file}.validators"
+    validators = _read_json(validators_file) if os.path.isfile(data_file) else None
+    headers = {}
+    if validators is not None:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+    reply = requests.get(url, headers=headers)
+    if reply.status_code != 200:
+        return reply.status_code
+    with open(data_file, "w") as f:
+        f.write(json.dumps(reply.json(), indent=2))
+    _write_json(
+        validators_file,
+        {
+            "etag": reply.headers.get("ETag"),
+            "last_modified": reply.headers.get("Last-Modified"),
+        },
+    )
+    return reply.status_code
+
+
+def load_catalog(data_file, snapshot=True):
+    """Return the catalog of `data_file`, parsed once per process (and reloaded
+    when the file changes). With `snapshot`, the parsed catalog is also kept as
+    a pickle next to the dataview cache to skip JSON parsing in new kernels."""
+    key = os.path.abspath(data_file)
+    stamp = _file_stamp(data_file)
+    with _catalogs_lock:
+        entry = _catalogs.get(key, None)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        catalog = HubCatalog(_parse_catalog(data_file, stamp, snapshot))
+        _catalogs[key] = (stamp, catalog)
+        return catalog
@@ -0,0 +1,97 @@
+#
+import threading
+
+from .cache import _read_json, _write_json
+from .util import HubException
+
+CURSOR_FIELDS = [
+    "namespace_id",
+    "dataview_id",
+    "start_index",
+    "end_index",
+    "interval",
+    "count",
+    "stored",
+    "next_page",
+    "rows",
+    "done",
+    "cached",
+]
+
+
+class DataviewCursor:
+    """Position of one dataview read: its query, the page token where it stops
+    and the rows fetched so far (a `cached` read goes on from that row of the
+    dataview cache). Each cursor advances on its own, so several
+    can be fetched at the same time from worker threads, and a cursor saved to
+    disk can be continued in another kernel with `DataviewCursor.load()`."""
+
+    def __init__(
+        self,
+        hub,
+        namespace_id,
+        dataview_id,
+        start_index,
+        end_index,
+        interval="",
+        count=0,
+        stored=True,
+        next_page=None,
+        rows=0,
+        done=False,
+        cached=False,
+    ):
+        self.hub = hub
+        self.namespace_id = namespace_id
+        self.dataview_id = dataview_id
+        self.start_index = start_index
+        self.end_index = end_index
+        self.interval = interval
+        self.count = count
+        self.stored = stored
+        self.next_page = next_page
+        self.rows = rows
+        self.done = done
+        self.cached = cached
+        self.__lock = threading.Lock()
+
+    def remaining(self) -> bool:
+        return not self.done
+
+    def fetch(self, max_rows=None, compact=False, engine="pandas"):
+        """Return the next rows of the read (all of them without `max_rows`)
+        as a DataFrame (engine="pandas"), a pyarrow.Table ("arrow") or an Arrow
+        backed DataFrame ("arrow-pandas"), and move the cursor after them"""
+        with self.__lock:
+            if self.done:
+                raise HubException(
+                    f"@@ no remaining data for dataview id {self.dataview_id}"
+                )
+            return self.hub._fetch_cursor(self, max_rows, compact, engine)
+
+    def to_dict(self):
+        with self.__lock:
+            return {field: getattr(self, field) for field in CURSOR_FIELDS}
+
+    @classmethod
+    def from_dict(cls, hub, state):
+        return cls(
+            hub, **{field: state[field] for field in CURSOR_FIELDS if field in state}
+        )
+
+    def save(self, path):
+        _write_json(path, self.to_dict())
+
+    @classmethod
+    def load(cls, hub, path):
+        state = _read_json(path)
+        if state is None:
+            raise HubException(f"@@ cannot read a dataview cursor from {path}")
+        return cls.from_dict(hub, state)
+
+    def __repr__(self):
+        state = "done" if self.done else "remaining"
+        return (
+            f"DataviewCursor({self.dataview_id}, {self.start_index}, "
+            f"{self.end_index}, rows={self.rows}, {state})"
+        )
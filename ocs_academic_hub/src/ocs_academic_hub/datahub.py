@@ -1,10 +1,14 @@
 #
 import ast
+import copy
+import functools
 import io
 import json
 import os
+import re
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from math import nan
 from typing import List, Union
@@ -18,7 +22,7 @@ import pkg_resources
 import requests
 from dateutil.parser import parse
 from gql import Client, gql
-from gql.transport.requests import RequestsHTTPTransport
+from graphql.language.printer import print_ast
 from ipywidgets import HTML
 from requests.structures import CaseInsensitiveDict
 from typeguard import typechecked
@@ -26,7 +30,51 @@ from urllib3.exceptions import HTTPError
 
 from . import __version__
 from .access import delete_jwt, get_previous_jwt, restore_previous_jwt, save_jwt
+from .arrow import (
+    arrow_column_types,
+    check_engine,
+    concat_tables,
+    page_last_timestamp,
+    parse_interpolated_table,
+    rows_before,
+    to_engine,
+)
+from .cache import (
+    DATAVIEW_CACHE_DIR,
+    DEFAULT_CACHE_MB,
+    DEFAULT_DEFINITION_TTL,
+    DataviewCache,
+    DefinitionCache,
+)
+from .catalog import load_catalog, save_catalog, version_key
+from .cursor import DataviewCursor
+from .downsample import downsampler
+from .export import DataviewExport, partition_ranges
+from .metrics import MetricsRegistry
+from .paging import (
+    MIN_PAGE_COUNT,
+    PREFETCH_DEPTH,
+    PagePrefetcher,
+    PageSizer,
+    page_size_key,
+)
 from .queries import *
+from .singleflight import SingleFlight, request_key
+from .snapshot import (
+    SNAPSHOT_DIR,
+    SNAPSHOT_WAIT,
+    DatasetSnapshot,
+    build_snapshot,
+    snapshot_name,
+)
+from .streams import (
+    STREAM_CATALOG_DIR,
+    STREAM_CATALOG_TTL,
+    STREAM_PAGE_SIZE,
+    StreamCatalog,
+    match_streams,
+)
+from .transport import TRANSPORT_OPTIONS, HubTransport, wire_bytes
 from .util import HubException, hub_authenticated, timer
 
 # import urllib3
@@ -39,6 +87,9 @@ GRAPHQL_ENDPOINT = "https://academichub-gw.azurewebsites.net/graphql"
 
 MAX_STORED_DV_ROWS = 2000000
 UXIE_CONSTANT = 100 * 1000
+MAX_BATCH_QUERIES = 50
+MAX_DATAVIEW_CONCURRENCY = 4
+MAX_STREAM_CONCURRENCY = 4
 
 hub_db_namespaces = CaseInsensitiveDict({})
 
@@ -63,48 +114,10 @@ stream_queries = {
 }
 
 
-def asset_id_fix(gqlh):
-    for i, database in enumerate(gqlh["Database"]):
-        for j, asset in enumerate(database["asset_with_dv"]):
-            if asset.get("asset_id", None) is None:
-                asset["asset_id"] = asset["name"]
-            else:
-                asset["name"] = asset["asset_id"]
-    return gqlh
-
-
-def initialize_hub_data(data_file):
-    global hub_db_namespaces
-    with open(data_file) as f:
-        gqlh = json.loads(f.read())
-    db_index = CaseInsensitiveDict({})
-    hub_db_namespaces.clear()
-    for i, database in enumerate(gqlh["Database"]):
-        db_index[database["asset_db"]] = i
-        hub_db_namespaces[database["name"]] = database["namespace"]
-    return asset_id_fix(gqlh), gqlh["Database"][0]["asset_db"], db_index
-
-
-def assets_and_metadata(gqlh, db_index, current_db):
-    assets_info = gqlh["Database"][db_index[current_db]]["asset_with_dv"]
-    asset_key = "name"
-    assets = sorted([i[asset_key].lower() for i in assets_info])
-    dv_column_key = {}
-    for i in assets_info:
-        for dv in i["has_dataview"]:
-            dv_column_key[dv["id"]] = dv.get("ocs_column_key", None)
-
-    def metaf(x):
-        return {} if x is None else eval(x)
-
-    metadata = {
-        assets_info[j][asset_key]: metaf(assets_info[j]["asset_metadata"])
-        for j in range(len(assets_info))
-    }
-    for key in metadata.keys():
-        d = metadata[key]
-        d.update({"Asset_Id": key})
-    return assets, metadata, dv_column_key
+def database_version(database):
+    version = database.get("version", "not available")
+    status = database.get("status", "-not set-")
+    return f"{version} (status: {status})"
 
 
 class GraphQLException(Exception):
@@ -112,15 +125,36 @@ class GraphQLException(Exception):
 
 
 def process_digital_states(df):
-    ds_columns = [col for col in list(df.columns) if col[-4:] == "__ds"]
-    if len(ds_columns) > 0:
-        for ds_col in ds_columns:
-            val_col = ds_col[:-4]
-            index = df[val_col].index[df[val_col].apply(np.isnan)]
-            df.loc[index, [ds_col]] = ""
-        df = df.drop(columns=[ds_col[:-4] for ds_col in ds_columns])
-        df = df.rename(columns={ds_col: ds_col[:-4] for ds_col in ds_columns})
-    return df
+    ds_columns = [col for col in df.columns if col[-4:] == "__ds"]
+    if len(ds_columns) == 0:
+        return df
+    # digital state names replace the state values, blank when there is none
+    val_columns = [ds_col[:-4] for ds_col in ds_columns]
+    states = df[ds_columns].where(df[val_columns].notna().to_numpy(), "")
+    df = df.drop(columns=val_columns)
+    df[ds_columns] = states
+    return df.rename(columns=dict(zip(ds_columns, val_columns)))
+
+
+def compact_dtypes(df, stream_types):
+    """float32 values and categorical strings (digital states, ids), with the
+    Stream_Type of a column when known"""
+    dtypes = {}
+    for col in df.columns:
+        stream_type = stream_types.get(col, None)
+        if col == "Timestamp" or stream_type in ["Integer", "Timestamp"]:
+            continue
+        if df[col].dtype == np.float64 and stream_type in [None, "Float"]:
+            dtypes[col] = np.float32
+        elif (
+            pd.api.types.is_object_dtype(df[col].dtype)
+            or pd.api.types.is_string_dtype(df[col].dtype)
+        ) and (
+            stream_type in ["Category", "String"]
+            or pd.api.types.infer_dtype(df[col], skipna=True) == "string"
+        ):
+            dtypes[col] = "category"
+    return df.astype(dtypes) if len(dtypes) > 0 else df
 
 
 def remap_campus_dataview_id(dv_id):
@@ -134,6 +168,329 @@ def asdict(item_metadata):
     return {i["Name"]: i["Value"] for i in item_metadata}
 
 
+def check_dataview_args(start_index, end_index, interval, sub_second_interval, stored):
+    if not sub_second_interval and not stored:
+        try:
+            datetime.strptime(interval, "%H:%M:%S")
+        except ValueError as e:
+            return f"interval has invalid format: {e}"
+    try:
+        parse(end_index)
+        parse(start_index)
+    except ValueError as e:
+        return f"start_index and/or end_index has invalid format: {e}"
+    return None
+
+
+def gateway_error_kind(e):
+    message = str(e).lower()
+    if "unauthenticated" in message:
+        return "unauthenticated"
+    for code in ["409", "502", "408", "503", "504"]:
+        if code in message:
+            return code
+    return None
+
+
+def interval_timedelta(interval):
+    # OCS time span format: [d.]hh:mm:ss[.fffffff]
+    days = 0
+    hours, sep, rest = interval.partition(":")
+    if "." in hours:
+        days, hours = hours.split(".", 1)
+    return pd.Timedelta(days=int(days)) + pd.to_timedelta(hours + sep + rest)
+
+
+def utc_timestamp(timestamp):
+    timestamp = pd.Timestamp(
+        parse(timestamp) if isinstance(timestamp, str) else timestamp
+    )
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize("UTC")
+    return timestamp.tz_convert("UTC")
+
+
+def index_string(timestamp):
+    return utc_timestamp(timestamp).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def split_dataview_range(start_index, end_index, interval, stored, parallel):
+    """Split [start_index, end_index] into (start, end, before) windows, where
+    `before` (if not None) excludes the boundary row of the next window"""
+    start = utc_timestamp(start_index)
+    end = utc_timestamp(end_index)
+    if stored:
+        bounds = [start + (end - start) * k / parallel for k in range(parallel + 1)]
+        windows = [
+            (index_string(bounds[k]), index_string(bounds[k + 1]), bounds[k + 1])
+            for k in range(parallel)
+        ]
+    else:
+        # interpolated windows hold whole interval steps, so the grid is unchanged
+        step = interval_timedelta(interval)
+        points = (end - start) // step + 1
+        parallel = max(1, min(parallel, points))
+        offsets = [points * k // parallel for k in range(parallel + 1)]
+        windows = [
+            (
+                index_string(start + offsets[k] * step),
+                index_string(start + (offsets[k + 1] - 1) * step),
+                None,
+            )
+            for k in range(parallel)
+        ]
+    windows[0] = (start_index,) + windows[0][1:]
+    windows[-1] = windows[-1][:1] + (end_index, None)
+    return windows
+
+
+def order_stored_rows(df):
+    # stored (narrow) rows come grouped by asset/field, each group sorted by time
+    if len(df) == 0:
+        return df
+    group_columns = [c for c in df.columns if c not in ("Timestamp", "Value")]
+    if len(group_columns) == 0:
+        return df.sort_values("Timestamp", kind="mergesort").reset_index(drop=True)
+    group = df.groupby(group_columns, sort=False).ngroup()
+    order = np.lexsort((df["Timestamp"].values, group.values))
+    return df.iloc[order].reset_index(drop=True)
+
+
+def parse_interpolated_page(csv):
+    return pd.read_csv(io.StringIO(csv), parse_dates=["Timestamp"])
+
+
+def parse_timestamps(values):
+    # the gateway sends UTC times as "YYYY-MM-DDThh:mm:ss[.fffffff]Z", which
+    # NumPy parses in one pass once the Z is removed
+    if all(isinstance(v, str) and v[-1:] == "Z" for v in values):
+        utc_times = np.array([v[:-1] for v in values], dtype="datetime64[ns]")
+        return pd.DatetimeIndex(utc_times).tz_localize("UTC")
+    return pd.to_datetime(values, utc=True)
+
+
+def record_column(values):
+    # numbers only (None: missing) make a NumPy column, anything else (digital
+    # state strings mixed with values, ids) stays as Python objects
+    if all(type(v) in (int, float) or v is None for v in values):
+        if all(type(v) is int for v in values):
+            return np.array(values, dtype=np.int64)
+        return np.array(values, dtype=np.float64)
+    return np.array(values, dtype=object)
+
+
+def parse_stored_page(records):
+    """Columns built straight from the decoded JSON records of a stored page"""
+    if len(records) == 0:
+        return pd.DataFrame()
+    columns = {}
+    for key in records[0]:
+        values = [record.get(key, None) for record in records]
+        if key == "Timestamp":
+            columns[key] = parse_timestamps(values)
+        else:
+            columns[key] = record_column(values)
+    return pd.DataFrame(columns)
+
+
+def concat_pages(pages):
+    if len(pages) == 0:
+        return pd.DataFrame()
+    if not isinstance(pages[0], pd.DataFrame):
+        return concat_tables(pages)
+    if len(pages) == 1:
+        return pages[0].reset_index(drop=True)
+    # pages of compact frames: same categories everywhere, or concat gives object
+    for col in pages[0].columns:
+        if not isinstance(pages[0][col].dtype, pd.CategoricalDtype):
+            continue
+        categorical = [
+            i
+            for i, page in enumerate(pages)
+            if isinstance(page.dtypes.get(col, None), pd.CategoricalDtype)
+        ]
+        categories = pd.api.types.union_categoricals(
+            [pages[i][col] for i in categorical], ignore_order=True
+        ).categories
+        for i in categorical:
+            pages[i] = pages[i].assign(
+                **{col: pages[i][col].cat.set_categories(categories)}
+            )
+    df = pd.concat(pages, ignore_index=True, sort=False)
+    pages.clear()
+    return df
+
+
+def join_dataview_frames(frames, prefixes):
+    # rows of interpolated dataviews are on the same time grid: align them on
+    # a Timestamp index in one concat
+    indexed = []
+    for df, prefix in zip(frames, prefixes):
+        if len(df) == 0:
+            continue
+        df = df.set_index("Timestamp")
+        df.columns = [f"{prefix}/{column}" for column in df.columns]
+        indexed.append(df)
+    if len(indexed) == 0:
+        return pd.DataFrame()
+    df = pd.concat(indexed, axis=1, join="outer", sort=True)
+    df.index.name = "Timestamp"
+    return df.reset_index()
+
+
+@functools.lru_cache(maxsize=256)
+def gql_document(query_string):
+    return gql(query_string)
+
+
+@functools.lru_cache(maxsize=256)
+def batch_document(query_string, size):
+    """Pack `size` copies of a single operation query into one document: each
+    copy gets its variables suffixed with _<i> and its top-level fields
+    aliased to _<i>_<response key>. Returns the document and, for each copy,
+    the list of (alias, response key)."""
+    operation = gql_document(query_string).definitions[0]
+    variables = []
+    selections = []
+    keys = []
+    for i in range(size):
+
+        def rename(text):
+            return re.sub(r"\$(\w+)", rf"$\1_{i}", text)
+
+        variables += [rename(print_ast(v)) for v in operation.variable_definitions]
+        copy_keys = []
+        for selection in operation.selection_set.selections:
+            key = (selection.alias or selection.name).value
+            field = copy.copy(selection)
+            field.alias = None
+            selections.append(f"_{i}_{key}: {rename(print_ast(field))}")
+            copy_keys.append((f"_{i}_{key}", key))
+        keys.append(copy_keys)
+    name = operation.name.value if operation.name else "query"
+    batch = f"query {name}_batch({', '.join(variables)}) {{\n"
+    batch += "\n".join(selections) + "\n}"
+    return gql_document(batch), keys
+
+
+def batch_variables(variable_values_list):
+    return {
+        f"{key}_{i}": value
+        for i, variable_values in enumerate(variable_values_list)
+        for key, value in variable_values.items()
+    }
+
+
+def definition_frame(items, column_key, stream_id):
+    columns = [
+        "Asset_Id",
+        "Column_Name",
+        "Stream_Type",
+        "Stream_UOM",
+        "Stream_Name",
+    ]
+    if stream_id:
+        columns += ["Stream_Id"]
+    rows = []
+    for item in items:
+        item_meta = CaseInsensitiveDict(asdict(item["Metadata"]))
+        rows.append(
+            [
+                item_meta["asset_id"],
+                item_meta[column_key],
+                ocstype2hub.get(item["TypeId"], "Float"),
+                item_meta.get("engunits", "-n/a-").replace("Â", ""),
+                item["Name"],
+            ]
+            + ([item["Id"]] if stream_id else [])
+        )
+    df = pd.DataFrame(rows, columns=columns, dtype=object)
+    return df.sort_values(["Column_Name", "Asset_Id"])
+
+
+def stream_exception(e):
+    try:
+        ed = ast.literal_eval(str(e))
+    except (ValueError, SyntaxError):
+        return e
+    if "404:" in ed["message"] or "400:" in ed["message"]:
+        return GraphQLException(ed["extensions"]["message"])
+    return e
+
+
+def check_namespace_reply(reply, namespace):
+    if len(reply["namespaces"]) == 0:
+        raise GraphQLException(
+            f"@@@ Namespace `{namespace}` not found (check hub.datasets())"
+        )
+    return reply
+
+
+def stream_ends(reply):
+    return (
+        parse(reply["first"]["Timestamp"]),
+        reply["first"].get("Value", None),
+        parse(reply["last"]["Timestamp"]),
+        reply["last"].get("Value", None),
+    )
+
+
+def get_streams_args(query, count, skip):
+    args = dict(count=STREAM_PAGE_SIZE)
+    if query:
+        args["query"] = query
+    if count:
+        args["count"] = count
+    if skip:
+        args["skip"] = skip
+    return args
+
+
+def stream_window_frame(data, column_name):
+    df = pd.DataFrame(data)
+    if len(df) > 0:
+        time_column = list(df.columns)[0]
+        df[time_column] = pd.to_datetime(df[time_column])
+        if column_name:
+            df.columns = [time_column, column_name]
+    return df
+
+
+def stream_interpolated_count(start, end, interval):
+    try:
+        t_interval = datetime.strptime(interval, "%H:%M:%S")
+        delta = t_interval - parse("1900-01-01")
+        return int((parse(end) - parse(start)) / delta) + 1
+    except ValueError as e:
+        raise GraphQLException(
+            f"@Error: start, end or interval (HH:MM:SS) has invalid format: {e}"
+        ) from None
+
+
+def stream_interpolated_frame(data, column_name, raw):
+    df = pd.DataFrame(data)
+    if len(df) > 0:
+        time_column = list(df.columns)[0]
+        df[time_column] = pd.to_datetime(df[time_column])
+        if not raw:
+            df = df.drop(df.columns[2:], axis=1)
+        if column_name:
+            df.columns = [df.columns[0], column_name] + list(df.columns[2:])
+    return df
+
+
+def join_stream_frames(frames):
+    # one column per stream, aligned on the time column of the first frame
+    indexed = [df.set_index(df.columns[0]) for df in frames if len(df) > 0]
+    if len(indexed) == 0:
+        return pd.DataFrame()
+    time_column = indexed[0].index.name
+    # copy() consolidates the one block per stream of the concat
+    df = pd.concat(indexed, axis=1, join="outer", sort=True).copy()
+    df.index.name = time_column
+    return df.reset_index()
+
+
 class HubClient:
     @typechecked
     def __init__(
@@ -147,6 +504,7 @@ class HubClient:
         self.__session_id = str(uuid.uuid4())
         self.__graphql_transport = None
         self.__graphql_client = None
+        self.__gw_url = GRAPHQL_ENDPOINT
 
         self.__options = options
         self.__debug = debug
@@ -154,14 +512,23 @@ class HubClient:
         self.__default_data = data_file == default_hub_data
         if debug and self.__default_data:
             print(f"@ Hub data file: {data_file}")
-        self.__gqlh, self.__current_db, self.__db_index = initialize_hub_data(data_file)
+        self.__catalog = load_catalog(data_file)
+        self.__gqlh = self.__catalog.gqlh
+        self.__db_index = self.__catalog.db_index
+        self.__current_db = self.__catalog.first_db()
         self.__current_db_index = 0
-        (
-            self.__assets,
-            self.__assets_metadata,
-            self.__dv_column_key,
-        ) = assets_and_metadata(self.__gqlh, self.__db_index, self.__current_db)
-        self.__dataview_next_page = None
+        hub_db_namespaces.clear()
+        hub_db_namespaces.update(self.__catalog.namespaces)
+        self.__cursor = None
+        self.__cache = None
+        self.__definitions = DefinitionCache()
+        self.__snapshots = []
+        self.__flights = SingleFlight()
+        self.__prefetch = 0
+        self.__stream_errors = {}
+        self.__stream_catalog = None
+        self.__metrics = MetricsRegistry()
+        self.__transport_options = dict(TRANSPORT_OPTIONS)
 
     @typechecked
     def session_id(self) -> str:
@@ -174,17 +541,82 @@ class HubClient:
     @typechecked
     def set_jwt(self, jwt: dict, gw_url):
         self.__jwt = jwt.copy()
-        self.__graphql_transport = RequestsHTTPTransport(
-            url=GRAPHQL_ENDPOINT if gw_url is None else gw_url,
-            use_json=True,
+        self.__gw_url = GRAPHQL_ENDPOINT if gw_url is None else gw_url
+        if self.__graphql_transport is not None:
+            self.__graphql_transport.close()
+        self.__graphql_transport = HubTransport(
+            url=self.__gw_url,
             headers={"Authorization": f"Bearer {self._id_token()}"},
-            verify=False,
-            retries=3,
+            **self.__transport_options,
         )
+        self.__graphql_transport.session.hooks["response"].append(self.__count_response)
         self.__graphql_client = Client(
             transport=self.__graphql_transport, fetch_schema_from_transport=False
         )
 
+    @typechecked
+    def set_transport_options(
+        self,
+        pool_size: int = None,
+        connect_timeout: float = None,
+        read_timeout: float = None,
+        compress: bool = None,
+        retries: int = None,
+    ) -> None:
+        """Change the gateway connection settings (options left to None are
+        kept): size of the connection pool, which should be at least the
+        `parallel` of dataview reads, timeouts in seconds, compressed replies
+        and retries of failed connections"""
+        options = dict(
+            pool_size=pool_size,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            compress=compress,
+            retries=retries,
+        )
+        self.__transport_options.update(
+            {key: value for key, value in options.items() if value is not None}
+        )
+        if self.__graphql_transport is not None:
+            self.set_jwt(self.__jwt, self.__gw_url)
+
+    @typechecked
+    def set_page_prefetch(self, depth: int = PREFETCH_DEPTH) -> None:
+        """Pipelined paging: dataview pages are requested up to `depth` pages
+        ahead by a background thread while the current one is parsed (0: off),
+        once the page count of the read stops growing"""
+        self.__prefetch = max(0, depth)
+
+    def transport_options(self) -> dict:
+        return dict(self.__transport_options)
+
+    def __count_response(self, response, *args, **kwargs):
+        self.__metrics.inc("hub_requests_total", status=response.status_code)
+        self.__metrics.inc("hub_response_bytes_total", len(response.content))
+        self.__metrics.inc("hub_wire_bytes_total", wire_bytes(response))
+
+    def metrics(self):
+        return self.__metrics
+
+    def stats(self):
+        """Metrics of the gateway traffic of this client as a DataFrame: call
+        and page latencies, rows and bytes received, retries, page size
+        changes and cache lookups"""
+        return self.__metrics.frame()
+
+    def stats_prometheus(self, extra_labels: dict = None) -> str:
+        return self.__metrics.to_prometheus(extra_labels)
+
+    def stats_json(self) -> str:
+        return self.__metrics.to_json()
+
+    def reset_stats(self) -> None:
+        self.__metrics.reset()
+
+    @typechecked
+    def gateway_url(self) -> str:
+        return self.__gw_url
+
     @typechecked
     def _id_token(self) -> str:
         token = self.__jwt.get("id_token", None)
@@ -193,8 +625,8 @@ class HubClient:
         return token
 
     @typechecked
-    def set_authenticated(self) -> None:
-        self.__authenticated = True
+    def set_authenticated(self, authenticated: bool = True) -> None:
+        self.__authenticated = authenticated
 
     @typechecked
     def authenticated(self) -> bool:
@@ -207,20 +639,25 @@ class HubClient:
     def gqlh(self):
         return self.__gqlh
 
+    def catalog(self):
+        return self.__catalog
+
+    def __dataset_index(self):
+        return self.__catalog.dataset(self.__current_db)
+
     @hub_authenticated
     @typechecked
     def asset_metadata(self, asset: str):
-        if asset.lower() not in self.__assets:
+        index = self.__dataset_index()
+        if asset.lower() not in index.asset_map:
             raise HubException(
                 f"@@ error: asset {asset} not in dataset asset list, check hub.assets()"
             )
 
-        return self.__assets_metadata[asset]
+        return dict(index.metadata[index.asset_map[asset.lower()]])
 
     def all_assets_metadata(self):
-        metadata = [
-            self.__assets_metadata[key] for key in self.__assets_metadata.keys()
-        ]
+        metadata = list(self.__dataset_index().metadata.values())
         return pd.DataFrame(metadata).sort_values(by=["Asset_Id"])
 
     @hub_authenticated
@@ -237,13 +674,171 @@ class HubClient:
 
     @typechecked
     def dataset_version(self) -> str:
-        version = self.__gqlh["Database"][self.__current_db_index].get(
-            "version", "not available"
+        return database_version(self.__gqlh["Database"][self.__current_db_index])
+
+    def __dataview_version(self, namespace_id, dataview_id):
+        for database in self.__gqlh["Database"]:
+            if database["namespace"] != namespace_id:
+                continue
+            for asset in database["asset_with_dv"]:
+                if any(dv["id"] == dataview_id for dv in asset["has_dataview"]):
+                    return database_version(database)
+        return self.dataset_version()
+
+    @typechecked
+    def enable_cache(
+        self, directory: str = DATAVIEW_CACHE_DIR, max_mb: int = DEFAULT_CACHE_MB
+    ) -> None:
+        self.__cache = DataviewCache(directory, max_mb)
+
+    @typechecked
+    def disable_cache(self) -> None:
+        self.__cache = None
+
+    @typechecked
+    def clear_cache(self) -> None:
+        if self.__cache is not None:
+            self.__cache.clear()
+
+    @typechecked
+    def set_definition_ttl(self, ttl: int = DEFAULT_DEFINITION_TTL) -> None:
+        """Keep the resolved data items of dataviews (definitions, column
+        counts) `ttl` seconds, 0 to always ask the gateway"""
+        self.__definitions.ttl = ttl
+        if ttl == 0:
+            self.__definitions.clear()
+
+    @typechecked
+    def clear_definition_cache(self) -> None:
+        self.__definitions.clear()
+
+    def definition_cache(self):
+        return self.__definitions
+
+    @timer
+    @hub_authenticated
+    @typechecked
+    def snapshot(
+        self,
+        dataset: str,
+        start_index: str,
+        end_index: str,
+        interval: str,
+        directory: str = SNAPSHOT_DIR,
+        timeout: int = SNAPSHOT_WAIT,
+    ):
+        """Interpolated data of all the dataviews of `dataset` saved once in
+        memory-mapped Arrow files under `directory`, shared by the kernels of
+        the node: the first one reads the gateway while the others wait. The
+        reads of this client covered by a snapshot are then served from it."""
+        database = next(
+            (
+                db
+                for db in self.__gqlh["Database"]
+                if db["name"].lower() == dataset.lower()
+            ),
+            None,
         )
-        status = self.__gqlh["Database"][self.__current_db_index].get(
-            "status", "-not set-"
+        if database is None:
+            raise HubException(
+                f"@@ Dataset {dataset} does not exist, please check hub.datasets()"
+            )
+        error = check_dataview_args(start_index, end_index, interval, False, False)
+        if error:
+            raise HubException(f"@Error: {error}")
+        check_engine("arrow")
+        namespace_id = database["namespace"]
+        start, end = utc_timestamp(start_index), utc_timestamp(end_index)
+        index = self.__catalog.dataset(database["asset_db"])
+        manifest = {
+            "dataset": database["name"],
+            "namespace": namespace_id,
+            "version": database_version(database),
+            "start": str(start),
+            "end": str(end),
+            "interval": interval,
+            "step": str(interval_timedelta(interval)),
+            "dataviews": sorted(index.dataview_text),
+        }
+
+        def read(dataview_id):
+            column_types = self.__column_types(
+                namespace_id, dataview_id, False, "arrow", False
+            )
+            table = self.__dataview_window(
+                namespace_id,
+                dataview_id,
+                index_string(start),
+                index_string(end),
+                interval,
+                0,
+                False,
+                None,
+                column_types=column_types,
+            )
+            return to_engine(table, "arrow")
+
+        name = snapshot_name(
+            database["name"], namespace_id, manifest["version"], start, end, interval
+        )
+        path = build_snapshot(directory, name, manifest, read, timeout)
+        print()
+        snapshot = DatasetSnapshot(path)
+        self.__snapshots = [s for s in self.__snapshots if s.path != path]
+        self.__snapshots.append(snapshot)
+        return snapshot
+
+    @typechecked
+    def snapshots(self) -> list:
+        return list(self.__snapshots)
+
+    @typechecked
+    def drop_snapshots(self) -> None:
+        """Stop serving reads from snapshots (their files are kept)"""
+        self.__snapshots = []
+
+    def __snapshot_rows(
+        self, namespace_id, dataview_id, start_index, end_index, interval
+    ):
+        # pyarrow.Table of the rows from a snapshot covering the read, or None
+        if len(self.__snapshots) == 0:
+            return None
+        start, end = utc_timestamp(start_index), utc_timestamp(end_index)
+        step = interval_timedelta(interval)
+        # a snapshot of a previous version of the dataset is not used
+        version = self.__dataview_version(namespace_id, dataview_id)
+        for snapshot in self.__snapshots:
+            if snapshot.covers(namespace_id, dataview_id, start, end, step, version):
+                self.__metrics.inc("hub_cache_lookups_total", result="snapshot")
+                return snapshot.rows(dataview_id, start, end)
+        return None
+
+    def __resolved_items(self, namespace_id, dataview_ids, query_ids):
+        # {(dataview_id, query_id): items}, None for an unknown dataview; the
+        # ones not cached are read in one batch
+        found, missing = {}, []
+        for dataview_id in dataview_ids:
+            for query_id in query_ids:
+                items = self.__definitions.get(namespace_id, dataview_id, query_id)
+                if items is None:
+                    missing.append((dataview_id, query_id))
+                found[(dataview_id, query_id)] = items
+        if len(missing) == 0:
+            return found
+        replies = self.graphql_batch(
+            q_resolved,
+            [
+                {"id": dataview_id, "namespace": namespace_id, "queryId": query_id}
+                for dataview_id, query_id in missing
+            ],
         )
-        return f"{version} (status: {status})"
+        for (dataview_id, query_id), reply in zip(missing, replies):
+            if len(reply["dataview"]) == 0:
+                continue
+            items = reply["dataview"][0]["resolvedDataItems"]["Items"]
+            self.__definitions.put(namespace_id, dataview_id, query_id, items)
+            found[(dataview_id, query_id)] = items
+        return found
 
     @hub_authenticated
     def set_dataset(self, dataset: str):
@@ -260,11 +855,7 @@ class HubClient:
             if self.__gqlh["Database"][j]["name"] == dataset:
                 self.__current_db_index = j
                 self.__current_db = self.__gqlh["Database"][j]["asset_db"]
-                (
-                    self.__assets,
-                    self.__assets_metadata,
-                    self.__dv_column_key,
-                ) = assets_and_metadata(self.__gqlh, self.__db_index, self.__current_db)
+                self.__dataset_index()
                 break
 
     @hub_authenticated
@@ -282,134 +873,59 @@ class HubClient:
     @hub_authenticated
     @typechecked
     def assets(self, filter: str = ""):
-        df = pd.DataFrame(columns=("Asset_Id", "Description"))
-        asset_description = {
-            i["name"]: i["description"]
-            for i in self.__gqlh["Database"][self.__db_index[self.__current_db]][
-                "asset_with_dv"
-            ]
-            if filter.lower() in i["name"].lower()
-        }
-        sorted_assets = sorted(list(asset_description.keys()))
-        for i, asset in enumerate(sorted_assets):
-            df.loc[i] = [asset, asset_description[asset]]
-        return df
+        return self.__dataset_index().find_assets(filter)
 
     @hub_authenticated
     @typechecked
     def asset_dataviews(
         self, filter: str = "default", asset: str = "", multiple_asset: bool = False
     ) -> Union[None, List[str]]:
+        index = self.__dataset_index()
         if len(asset) > 0:
-            if asset.lower() not in self.__assets:
+            if asset.lower() not in index.asset_map:
                 raise HubException(
                     f"@@ error: asset {asset} not in dataset asset list, check hub.assets()"
                 )
-
-        if not multiple_asset:
-
-            def len_test(li):
-                return len(li) == 1
-
-        else:
-
-            def len_test(li):
-                return len(li) > 1
-
-        if asset == "":
-
-            def asset_test(_x, _y):
-                return True
-
-        else:
-
-            def asset_test(this_asset, asset_list):
-                return this_asset.lower() in [i.lower() for i in asset_list]
-
-        dataviews = []
-        for j in self.__gqlh["Database"][self.__db_index[self.__current_db]][
-            "asset_with_dv"
-        ]:
-            if len(asset) > 0 and j["name"].lower() == asset.lower():
-                dataviews = j["has_dataview"]
-                break
-            else:
-                dataviews.extend(j["has_dataview"])
-
-        return sorted(
-            list(
-                set(
-                    [
-                        i["id"]
-                        for i in dataviews
-                        if (
-                            filter.lower() in i["id"]
-                            or filter.lower() in i["description"].lower()
-                        )
-                        and asset_test(asset, i["asset_id"])
-                        and len_test(i["asset_id"])
-                    ]
-                )
-            )
-        )
+        return index.find_dataviews(filter, asset, multiple_asset)
 
     @hub_authenticated
     @typechecked
     def dataview_definition(
         self, namespace_id: str, dataview_id: str, stream_id: bool = False
     ):
-        columns = [
-            "Asset_Id",
-            "Column_Name",
-            "Stream_Type",
-            "Stream_UOM",
-            "Stream_Name",
+        return self.dataview_definitions(namespace_id, [dataview_id], stream_id)[
+            dataview_id
         ]
-        if stream_id:
-            columns += ["Stream_Id"]
-        df = pd.DataFrame(columns=columns)
 
-        data_items = self.graphql_query(
-            q_resolved,
-            {"id": dataview_id, "namespace": namespace_id, "queryId": "Asset_value"},
-        )
-        if len(data_items["dataview"]) == 0:
-            raise HubException(
-                f"@@ Bad namespace ({namespace_id}) and/or dataview ID ({dataview_id})"
+    @hub_authenticated
+    @typechecked
+    def dataview_definitions(
+        self, namespace_id: str, dataview_ids: List[str], stream_id: bool = False
+    ) -> dict:
+        resolved = self.__resolved_items(namespace_id, dataview_ids, ["Asset_value"])
+        definitions = {}
+        for dataview_id in dataview_ids:
+            items = resolved[(dataview_id, "Asset_value")]
+            if items is None:
+                raise HubException(
+                    f"@@ Bad namespace ({namespace_id}) and/or dataview ID ({dataview_id})"
+                )
+            v2_column_key = self.__dataset_index().dv_column_key.get(dataview_id, None)
+            column_key = (
+                "column_name" if v2_column_key is None else f"{v2_column_key}|column"
             )
-        v2_column_key = self.__dv_column_key.get(dataview_id, None)
-        column_key = (
-            "column_name" if v2_column_key is None else f"{v2_column_key}|column"
-        )
-        items = data_items["dataview"][0]["resolvedDataItems"]["Items"]
-        for i, item in enumerate(items):
-            item_meta = CaseInsensitiveDict(asdict(item["Metadata"]))
-            column_values = [
-                item_meta["asset_id"],
-                item_meta[column_key],
-                ocstype2hub.get(item["TypeId"], "Float"),
-                item_meta.get("engunits", "-n/a-").replace("Â", ""),
-                item["Name"],
-            ]
-            if stream_id:
-                column_values += [item["Id"]]
-            df.loc[i] = column_values
-        return df.sort_values(["Column_Name", "Asset_Id"])
+            definitions[dataview_id] = definition_frame(items, column_key, stream_id)
+        return definitions
 
     def dataview_columns(self, namespace_id: str, dataview_id: str):
-        data_items = self.graphql_query(
-            q_resolved,
-            {"id": dataview_id, "namespace": namespace_id, "queryId": "Asset_value"},
-        )
-        digital_items = self.graphql_query(
-            q_resolved,
-            {"id": dataview_id, "namespace": namespace_id, "queryId": "Asset_digital"},
-        )
-        return (
-            len(data_items["dataview"][0]["resolvedDataItems"]["Items"])
-            + len(digital_items["dataview"][0]["resolvedDataItems"]["Items"])
-            + 1
+        resolved = self.__resolved_items(
+            namespace_id, [dataview_id], ["Asset_value", "Asset_digital"]
         )
+        if any(items is None for items in resolved.values()):
+            raise HubException(
+                f"@@ Bad namespace ({namespace_id}) and/or dataview ID ({dataview_id})"
+            )
+        return sum(len(items) for items in resolved.values()) + 1
 
     def __get_data_interpolated(
         self,
@@ -470,11 +986,101 @@ class HubClient:
 
     @hub_authenticated
     def remaining_data(self) -> bool:
-        return False if self.__dataview_next_page is None else True
+        return self.__cursor is not None and self.__cursor.remaining()
 
     @hub_authenticated
     def reset_remaining_data(self) -> bool:
-        self.__dataview_next_page = None
+        self.__cursor = None
+
+    def last_cursor(self):
+        """Cursor of the last dataview read, to resume it with `fetch()`"""
+        return self.__cursor
+
+    @hub_authenticated
+    @typechecked
+    def dataview_stored_cursor(
+        self,
+        namespace_id: str,
+        dataview_id: str,
+        start_index: str,
+        end_index: str,
+        count: int = 0,
+    ) -> DataviewCursor:
+        """Cursor over the stored data of a dataview: nothing is read until
+        its `fetch(max_rows)` is called"""
+        error = check_dataview_args(start_index, end_index, "", False, True)
+        if error:
+            raise HubException(f"@Error: {error}")
+        return DataviewCursor(
+            self, namespace_id, dataview_id, start_index, end_index, count=count
+        )
+
+    def _fetch_cursor(self, cursor, max_rows=None, compact=False, engine="pandas"):
+        if cursor.cached:
+            return self.__fetch_cached_cursor(cursor, max_rows, compact, engine)
+        column_types = self.__column_types(
+            cursor.namespace_id, cursor.dataview_id, cursor.stored, engine, compact
+        )
+        stream_types = (
+            self.__stream_types(cursor.namespace_id, cursor.dataview_id, cursor.stored)
+            if compact and column_types is None
+            else None
+        )
+        pages = []
+        rows = 0
+        next_page = None
+        for next_page, page in self.__dataview_pages(
+            cursor.namespace_id,
+            cursor.dataview_id,
+            cursor.start_index,
+            cursor.end_index,
+            cursor.interval,
+            cursor.count,
+            cursor.stored,
+            cursor.next_page,
+            stream_types,
+            column_types,
+        ):
+            pages.append(page)
+            rows += len(page)
+            if max_rows is not None and rows >= max_rows:
+                break
+            if next_page is not None:
+                print("+", end="", flush=True)
+        print()
+        cursor.next_page = next_page
+        cursor.rows += rows
+        cursor.done = next_page is None
+        return to_engine(concat_pages(pages), engine)
+
+    def __fetch_cached_cursor(self, cursor, max_rows, compact, engine, parallel=1):
+        # the rows of the whole read come from the cache again (from the gateway
+        # for the ranges evicted since), the cursor counts those returned
+        df = self.__dataview_cached(
+            cursor.namespace_id,
+            cursor.dataview_id,
+            cursor.start_index,
+            cursor.end_index,
+            cursor.interval,
+            cursor.count,
+            cursor.stored,
+            parallel,
+        )
+        print()
+        total = len(df)
+        if cursor.rows > 0 or (max_rows is not None and max_rows < total):
+            last = total if max_rows is None else cursor.rows + max_rows
+            df = df.iloc[cursor.rows : last].reset_index(drop=True)
+        cursor.rows += len(df)
+        cursor.done = cursor.rows >= total
+        if compact:
+            df = compact_dtypes(
+                df,
+                self.__stream_types(
+                    cursor.namespace_id, cursor.dataview_id, cursor.stored
+                ),
+            )
+        return to_engine(df, engine)
 
     @timer
     @hub_authenticated
@@ -490,6 +1096,9 @@ class HubClient:
         sub_second_interval: bool = False,
         verbose: bool = False,
         stored: bool = False,
+        parallel: int = 1,
+        compact: bool = False,
+        engine: str = "pandas",
     ):
         try:
             return self.dataview_get_data_pd(
@@ -502,10 +1111,497 @@ class HubClient:
                 sub_second_interval,
                 verbose,
                 stored,
+                parallel=parallel,
+                compact=compact,
+                engine=engine,
             )
         except GraphQLException as e:
             raise e
 
+    @timer
+    @hub_authenticated
+    @typechecked
+    def dataviews_interpolated_pd(
+        self,
+        namespace_id: str,
+        dataview_ids: List[str],
+        start_index: str,
+        end_index: str,
+        interval: str,
+        count: int = 0,
+        sub_second_interval: bool = False,
+        max_concurrency: int = MAX_DATAVIEW_CONCURRENCY,
+        prefixes: List[str] = None,
+        compact: bool = False,
+    ):
+        """Interpolated data of several dataviews over the same range, read at
+        the same time (up to `max_concurrency` dataviews), joined on their
+        common Timestamp in one wide DataFrame. Columns are named
+        `<prefix>/<column>`, with the dataview ids as default prefixes."""
+        error = check_dataview_args(
+            start_index, end_index, interval, sub_second_interval, False
+        )
+        if error:
+            raise HubException(f"@Error: {error}")
+        if prefixes is None:
+            prefixes = dataview_ids
+        if len(prefixes) != len(dataview_ids) or len(set(prefixes)) != len(prefixes):
+            raise HubException("@@ prefixes should be unique, one per dataview id")
+
+        def read(dataview_id):
+            stream_types = (
+                self.__stream_types(namespace_id, dataview_id, False)
+                if compact
+                else None
+            )
+            table = self.__snapshot_rows(
+                namespace_id, dataview_id, start_index, end_index, interval
+            )
+            if table is not None:
+                df = to_engine(table, "pandas")
+                return df if stream_types is None else compact_dtypes(df, stream_types)
+            if self.__cache is not None:
+                df = self.__dataview_cached(
+                    namespace_id,
+                    dataview_id,
+                    start_index,
+                    end_index,
+                    interval,
+                    count,
+                    False,
+                    1,
+                )
+                return df if stream_types is None else compact_dtypes(df, stream_types)
+            return self.__dataview_window(
+                namespace_id,
+                dataview_id,
+                start_index,
+                end_index,
+                interval,
+                count,
+                False,
+                None,
+                stream_types,
+            )
+
+        workers = max(1, min(max_concurrency, len(dataview_ids)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(read, dataview_ids))
+        print()
+        return join_dataview_frames(frames, prefixes)
+
+    @timer
+    @hub_authenticated
+    @typechecked
+    def dataview_downsampled_pd(
+        self,
+        namespace_id: str,
+        dataview_id: str,
+        start_index: str,
+        end_index: str,
+        interval: str = "",
+        points: int = 1000,
+        how: Union[str, List[str]] = "mean",
+        stored: bool = False,
+        count: int = 0,
+        sub_second_interval: bool = False,
+    ):
+        """Dataview data reduced to about `points` rows per column for plotting,
+        page by page as they are received (the full data is never kept):
+        aggregates of `points` time buckets (`how` in "min", "max", "mean",
+        "first", "last" or a list of them) or, with how="lttb", the rows
+        picked by Largest-Triangle-Three-Buckets"""
+        error = check_dataview_args(
+            start_index, end_index, interval, sub_second_interval, stored
+        )
+        if error:
+            raise HubException(f"@Error: {error}")
+        reducer = downsampler(
+            utc_timestamp(start_index), utc_timestamp(end_index), points, how
+        )
+        for next_page, page in self.__dataview_pages(
+            namespace_id,
+            dataview_id,
+            start_index,
+            end_index,
+            interval,
+            count,
+            stored,
+        ):
+            reducer.add(page)
+            if next_page is not None:
+                print("+", end="", flush=True)
+        print()
+        return reducer.result()
+
+    @hub_authenticated
+    @typechecked
+    def iter_dataview_pages(
+        self,
+        namespace_id: str,
+        dataview_id: str,
+        start_index: str,
+        end_index: str,
+        interval: str = "",
+        count: int = 0,
+        sub_second_interval: bool = False,
+        stored: bool = False,
+        compact: bool = False,
+        engine: str = "pandas",
+    ):
+        """Yield one DataFrame per dataview data page, as pages are received
+        (pyarrow.Tables of interpolated pages with engine="arrow")"""
+        error = check_dataview_args(
+            start_index, end_index, interval, sub_second_interval, stored
+        )
+        if error:
+            raise HubException(f"@Error: {error}")
+        check_engine(engine)
+        column_types = self.__column_types(
+            namespace_id, dataview_id, stored, engine, compact
+        )
+        stream_types = (
+            self.__stream_types(namespace_id, dataview_id, stored)
+            if compact and column_types is None
+            else None
+        )
+        for _, page in self.__dataview_pages(
+            namespace_id,
+            dataview_id,
+            start_index,
+            end_index,
+            interval,
+            count,
+            stored,
+            stream_types=stream_types,
+            column_types=column_types,
+        ):
+            yield page if engine != "arrow-pandas" else to_engine(page, engine)
+
+    def __stream_types(self, namespace_id, dataview_id, stored):
+        # stored rows are narrow (Field, Value), columns have no stream type
+        if stored:
+            return {}
+        try:
+            definition = self.dataview_definition(
+                namespace_id, remap_campus_dataview_id(dataview_id)
+            )
+        except HubException:
+            return {}
+        return dict(zip(definition["Column_Name"], definition["Stream_Type"]))
+
+    def __column_types(self, namespace_id, dataview_id, stored, engine, compact):
+        # declared Arrow types of interpolated pages, None to parse with pandas
+        if engine == "pandas" or stored:
+            return None
+        stream_types = self.__stream_types(namespace_id, dataview_id, stored)
+        return arrow_column_types(stream_types, compact)
+
+    def __dataview_pages(
+        self,
+        namespace_id,
+        dataview_id,
+        start_index,
+        end_index,
+        interval,
+        count,
+        stored,
+        next_page=None,
+        stream_types=None,
+        column_types=None,
+    ):
+        # with `stream_types`, pages are made compact (see compact_dtypes); with
+        # `column_types`, interpolated pages are pyarrow.Tables
+        dataview_f = self.__get_data_stored if stored else self.__get_data_interpolated
+        dataview_id = remap_campus_dataview_id(dataview_id)
+        # a new count is sent with the next page token: stored rows are grouped
+        # by field, a stored read goes on from its token; an interpolated read
+        # starts a new query after the last timestamp delivered
+        sizer = PageSizer(page_size_key(namespace_id, dataview_id, stored), count)
+        if next_page is None:
+            count = sizer.count
+
+        mode = "stored" if stored else "interpolated"
+        delay_50x = 1
+        last_timestamp = None
+        page_rows = 0
+
+        def fetch(count, start_index):
+            return lambda next_page: dataview_f(
+                namespace_id=namespace_id,
+                dataview_id=dataview_id,
+                count=count,
+                start_index=start_index,
+                end_index=end_index,
+                interval=interval,
+                next_page=next_page,
+            )
+
+        # with prefetch, the next pages are requested while this one is parsed;
+        # not while the count grows: the pages prefetched would have the count
+        # of their query, smaller than the next one
+        prefetcher = PagePrefetcher(self.__prefetch) if self.__prefetch > 0 else None
+        try:
+            while True:
+                start_time = time.perf_counter()
+                try:
+                    query = (count, start_index)
+                    reply = None
+                    if prefetcher is not None:
+                        reply = prefetcher.take(query, next_page)
+                    if reply is None:
+                        reply = fetch(count, start_index)(next_page)
+                    next_page, csv_or_json, _ = reply
+                    if prefetcher is not None and sizer.growing:
+                        prefetcher.stop()
+                    elif prefetcher is not None:
+                        prefetcher.start(query, next_page, fetch(count, start_index))
+                except HTTPError as e:
+                    if "502" in str(e):
+                        print("@", end="")
+                        self.__metrics.inc("hub_retries_total", status="502")
+                        continue
+                    raise e
+                except Exception as e:
+                    kind = gateway_error_kind(e)
+                    if kind is None:
+                        raise e
+                    if kind == "unauthenticated":
+                        self.__authenticated = False
+                        raise GraphQLException(
+                            "@@@ Please (re)start Hub login sequence (cell with hub_login() )"
+                        )
+                    if kind == "409":
+                        print("#", end="")
+                        self.__metrics.inc("hub_retries_total", status=kind)
+                        continue
+                    if kind == "502":
+                        print("[@]", end="")
+                        time.sleep(delay_50x)
+                        delay_50x *= 2
+                        if delay_50x > 8:
+                            self.__metrics.inc("hub_errors_total", status=kind)
+                            raise e
+                        self.__metrics.inc("hub_retries_total", status=kind)
+                        continue
+                    if kind != "408":
+                        print(f"[restart-{str(e)}]", end="")
+                        self.__metrics.inc("hub_errors_total", status=kind)
+                        raise GraphQLException(f"Got: {str(e)}")
+
+                    # the page which timed out is requested again, smaller
+                    if sizer.count == 0:
+                        sizer.start(
+                            self.__page_count_estimate(
+                                namespace_id, dataview_id, page_rows
+                            )
+                        )
+                    count = sizer.timeout()
+                    print(f"@({count})", end="")
+                    if count < MIN_PAGE_COUNT:
+                        self.__metrics.inc("hub_errors_total", status=kind)
+                        raise e
+                    self.__metrics.inc("hub_retries_total", status=kind)
+                    self.__metrics.inc("hub_page_size_changes_total", direction="down")
+                    if not stored:
+                        next_page = None
+                        if last_timestamp is not None:
+                            start_index = index_string(
+                                last_timestamp + interval_timedelta(interval)
+                            )
+                    continue
+
+                self.__metrics.observe(
+                    "hub_page_seconds", time.perf_counter() - start_time, mode=mode
+                )
+                if len(csv_or_json) > 0:
+                    if stored:
+                        page = parse_stored_page(csv_or_json)
+                    elif column_types is not None:
+                        page = parse_interpolated_table(csv_or_json, column_types)
+                    else:
+                        page = parse_interpolated_page(csv_or_json)
+                    self.__metrics.inc("hub_page_rows_total", len(page), mode=mode)
+                    page_rows = max(page_rows, len(page))
+                    grown = next_page is not None and sizer.success(len(page))
+                    if grown:
+                        self.__metrics.inc(
+                            "hub_page_size_changes_total", direction="up"
+                        )
+                    if len(page) > 0:
+                        last_timestamp = page_last_timestamp(page)
+                        if isinstance(page, pd.DataFrame):
+                            page = process_digital_states(page)
+                        if stream_types is not None:
+                            page = compact_dtypes(page, stream_types)
+                        yield next_page, page
+                    if grown:
+                        count = sizer.count
+                        if not stored:
+                            next_page = None
+                            start_index = index_string(
+                                last_timestamp + interval_timedelta(interval)
+                            )
+                        continue
+
+                if next_page is None:
+                    break
+        finally:
+            if prefetcher is not None:
+                prefetcher.stop()
+        sizer.finish()
+
+    def __page_count_estimate(self, namespace_id, dataview_id, page_rows):
+        # the gateway default page size, known from a full page, else the
+        # count which keeps a page under UXIE_CONSTANT values
+        if page_rows > 0:
+            return page_rows
+        width = self.__catalog.dataview_width(dataview_id)
+        if width is None:
+            width = self.dataview_columns(namespace_id, dataview_id)
+        return UXIE_CONSTANT // width
+
+    def __dataview_window(
+        self,
+        namespace_id,
+        dataview_id,
+        start_index,
+        end_index,
+        interval,
+        count,
+        stored,
+        before,
+        stream_types=None,
+        column_types=None,
+    ):
+        pages = []
+        for next_page, page in self.__dataview_pages(
+            namespace_id,
+            dataview_id,
+            start_index,
+            end_index,
+            interval,
+            count,
+            stored,
+            stream_types=stream_types,
+            column_types=column_types,
+        ):
+            if before is not None:
+                page = rows_before(page, before)
+            pages.append(page)
+            if next_page is not None:
+                print("+", end="", flush=True)
+        return concat_pages(pages)
+
+    def __dataview_parallel(
+        self,
+        namespace_id,
+        dataview_id,
+        start_index,
+        end_index,
+        interval,
+        count,
+        stored,
+        parallel,
+        stream_types=None,
+        column_types=None,
+    ):
+        windows = split_dataview_range(
+            start_index, end_index, interval, stored, parallel
+        )
+        with ThreadPoolExecutor(max_workers=parallel) as pool:
+            futures = [
+                pool.submit(
+                    self.__dataview_window,
+                    namespace_id,
+                    dataview_id,
+                    window_start,
+                    window_end,
+                    interval,
+                    count,
+                    stored,
+                    before,
+                    stream_types,
+                    column_types,
+                )
+                for window_start, window_end, before in windows
+            ]
+            frames = [future.result() for future in futures]
+        df = concat_pages(frames)
+        return order_stored_rows(df) if stored else df
+
+    def __dataview_cached(
+        self,
+        namespace_id,
+        dataview_id,
+        start_index,
+        end_index,
+        interval,
+        count,
+        stored,
+        parallel,
+    ):
+        start = utc_timestamp(start_index)
+        end = utc_timestamp(end_index)
+        if stored:
+            step = pd.Timedelta(0)
+            key = DataviewCache.key(namespace_id, dataview_id, stored)
+        else:
+            # interpolated rows are only reusable on the same time grid
+            step = interval_timedelta(interval)
+            phase = (start - pd.Timestamp(0, tz="UTC")) % step
+            key = DataviewCache.key(
+                namespace_id, dataview_id, stored, interval, phase.value
+            )
+        version = self.__dataview_version(namespace_id, dataview_id)
+        cached, missing = self.__cache.lookup(key, version, start, end, step)
+        if cached is None:
+            result = "miss"
+        else:
+            result = "partial" if len(missing) > 0 else "hit"
+        self.__metrics.inc("hub_cache_lookups_total", result=result)
+
+        frames = [] if cached is None else [cached]
+        now = pd.Timestamp.now(tz="UTC")
+        for gap_start, gap_end in missing:
+            df = self.__dataview_parallel(
+                namespace_id,
+                dataview_id,
+                index_string(gap_start),
+                index_string(gap_end),
+                interval,
+                count,
+                stored,
+                parallel,
+            )
+            if stored and cached is not None and len(df) > 0:
+                # a stored gap starts and ends on the cached ranges: the events
+                # at these times are in the cached rows already
+                boundary = cached["Timestamp"].isin([gap_start, gap_end])
+                boundary = cached.loc[boundary, "Timestamp"].unique()
+                frames.append(df[~df["Timestamp"].isin(boundary)])
+            else:
+                frames.append(df)
+            # data may still come in after now, so it is not covered yet
+            covered_end = min(gap_end, now)
+            if not stored:
+                covered_end = gap_start + (covered_end - gap_start) // step * step
+            if covered_end >= gap_start:
+                if len(df) > 0:
+                    df = df[df["Timestamp"] <= covered_end]
+                self.__cache.store(key, version, gap_start, covered_end, df)
+
+        df = concat_pages(frames)
+        if len(df) == 0:
+            return df
+        if stored:
+            return order_stored_rows(df)
+        return (
+            df.drop_duplicates(subset="Timestamp")
+            .sort_values("Timestamp")
+            .reset_index(drop=True)
+        )
+
     def dataview_get_data_pd(
         self,
         namespace_id: str,
@@ -519,22 +1615,18 @@ class HubClient:
         stored: bool = False,
         resume: bool = False,
         max_stored_rows=MAX_STORED_DV_ROWS,
+        parallel: int = 1,
+        compact: bool = False,
+        engine: str = "pandas",
     ):
-        df = pd.DataFrame()
-        next_page = None
+        check_engine(engine)
         if not resume:
-            if not sub_second_interval and not stored:
-                try:
-                    datetime.strptime(interval, "%H:%M:%S")
-                except ValueError as e:
-                    print(f"@Error: interval has invalid format: {e}")
-                    return df
-            try:
-                parse(end_index)
-                parse(start_index)
-            except ValueError as e:
-                print(f"@Error: start_index and/or end_index has invalid format: {e}")
-                return df
+            error = check_dataview_args(
+                start_index, end_index, interval, sub_second_interval, stored
+            )
+            if error:
+                print(f"@Error: {error}")
+                return to_engine(pd.DataFrame(), engine)
             if verbose:
                 now = datetime.now().isoformat()
                 summary = f"<@dataview_interpolated_pd/{dataview_id}/{start_index}/{end_index}/{interval}  t={now}"
@@ -543,86 +1635,90 @@ class HubClient:
         else:
             if not self.remaining_data():
                 print(f"@Error: no remaining data for stored dataview id {dataview_id}")
-                return df
-            next_page = self.__dataview_next_page
-
-        dataview_f = self.__get_data_stored if stored else self.__get_data_interpolated
-        dataview_id = remap_campus_dataview_id(dataview_id)
+                return to_engine(pd.DataFrame(), engine)
+            return self._fetch_cursor(
+                self.__cursor, max_stored_rows if stored else None, compact, engine
+            )
 
-        delay_50x = 1
-        while True:
-            try:
-                # print(f"[{next_page}]", end="")
-                next_page, csv_or_json, _ = dataview_f(
-                    namespace_id=namespace_id,
-                    dataview_id=dataview_id,
-                    count=count,
-                    start_index=start_index,
-                    end_index=end_index,
-                    interval=interval,
-                    next_page=next_page,
+        self.__cursor = None
+        table = (
+            None
+            if stored
+            else self.__snapshot_rows(
+                namespace_id, dataview_id, start_index, end_index, interval
+            )
+        )
+        if table is not None:
+            df = to_engine(table, engine)
+            if compact and engine == "pandas":
+                df = compact_dtypes(
+                    df, self.__stream_types(namespace_id, dataview_id, stored)
                 )
-                # print(f"[{len(csv)}, {type(csv)}, {str(csv)}]", end="")
-                if not stored:
-                    df = df.append(
-                        pd.read_csv(
-                            io.StringIO(csv_or_json), parse_dates=["Timestamp"]
-                        ),
-                        ignore_index=True,
-                    )
-                else:
-                    df = df.append(pd.read_json(json.dumps(csv_or_json)))
-                    if len(df) >= max_stored_rows:
-                        self.__dataview_next_page = next_page
-                        print()
-                        break
+            return df
 
-                if next_page is None:
-                    print()
-                    self.__dataview_next_page = None
-                    break
-                print("+", end="", flush=True)
-            except HTTPError as e:
-                if "502" in str(e):
-                    print("@", end="")
-                    continue
-            except Exception as e:
-                if not any(
-                    ss in str(e).lower()
-                    for ss in ["408", "503", "504", "409", "502", "unauthenticated"]
-                ):
-                    raise e
-                if "unauthenticated" in str(e).lower():
-                    self.__authenticated = False
-                    raise GraphQLException(
-                        "@@@ Please (re)start Hub login sequence (cell with hub_login() )"
-                    )
-                if "409" in str(e):
-                    print("#", end="")
-                    continue
-                if "502" in str(e): #  or "504" in str(e):
-                    print("[@]", end="")
-                    time.sleep(delay_50x)
-                    delay_50x *= 2
-                    if delay_50x > 8:
-                        raise e
-                    continue
-                if "408" not in str(e):
-                    print(f"[restart-{str(e)}]", end="")
-                    raise GraphQLException(f"Got: {str(e)}")
-
-                df = pd.DataFrame()
-                next_page = None
-                if count == 0:
-                    count = UXIE_CONSTANT // self.dataview_columns(
-                        namespace_id, dataview_id
-                    )
-                count = count // 2
-                print(f"@({count})", end="")
-                if count < 40:
-                    raise e
+        if self.__cache is None and parallel <= 1:
+            self.__cursor = DataviewCursor(
+                self,
+                namespace_id,
+                dataview_id,
+                start_index,
+                end_index,
+                interval,
+                count,
+                stored,
+            )
+            return self._fetch_cursor(
+                self.__cursor, max_stored_rows if stored else None, compact, engine
+            )
 
-        return process_digital_states(df)
+        if self.__cache is not None:
+            if stored:
+                # stored rows are grouped by field: events coming in after now
+                # would move the rows of the next fields between two fetches
+                now = pd.Timestamp.now(tz="UTC")
+                if utc_timestamp(end_index) > now:
+                    end_index = index_string(now)
+            self.__cursor = DataviewCursor(
+                self,
+                namespace_id,
+                dataview_id,
+                start_index,
+                end_index,
+                interval,
+                count,
+                stored,
+                cached=True,
+            )
+            return self.__fetch_cached_cursor(
+                self.__cursor,
+                max_stored_rows if stored else None,
+                compact,
+                engine,
+                parallel,
+            )
+
+        stream_types = (
+            self.__stream_types(namespace_id, dataview_id, stored) if compact else None
+        )
+
+        # each window is read to its end, there is no page left to resume
+        column_types = self.__column_types(
+            namespace_id, dataview_id, stored, engine, compact
+        )
+        df = self.__dataview_parallel(
+            namespace_id,
+            dataview_id,
+            start_index,
+            end_index,
+            interval,
+            count,
+            stored,
+            parallel,
+            None if column_types is not None else stream_types,
+            column_types,
+        )
+        print()
+        return to_engine(df, engine)
 
     @timer
     @hub_authenticated
@@ -636,6 +1732,9 @@ class HubClient:
         count: int = 0,
         resume: bool = False,
         max_rows=MAX_STORED_DV_ROWS,
+        parallel: int = 1,
+        compact: bool = False,
+        engine: str = "pandas",
     ):
         try:
             result = self.dataview_get_data_pd(
@@ -648,6 +1747,9 @@ class HubClient:
                 stored=True,
                 resume=resume,
                 max_stored_rows=max_rows,
+                parallel=parallel,
+                compact=compact,
+                engine=engine,
             )
         except GraphQLException as e:
             raise e
@@ -663,6 +1765,79 @@ class HubClient:
                 raise e
         return result
 
+    @hub_authenticated
+    @typechecked
+    def export_dataview(
+        self,
+        namespace_id: str,
+        dataview_id: str,
+        start_index: str,
+        end_index: str,
+        path: str,
+        interval: str = "",
+        stored: bool = True,
+        partition: str = "day",
+        count: int = 0,
+        sub_second_interval: bool = False,
+    ) -> dict:
+        """Write dataview data to Parquet files under `path`, one per day or
+        month, page by page. Calling it again with the same arguments resumes
+        after the partitions already written (see path/_manifest.json)."""
+        error = check_dataview_args(
+            start_index, end_index, interval, sub_second_interval, stored
+        )
+        if error:
+            raise HubException(f"@Error: {error}")
+        if partition not in ["day", "month"]:
+            raise HubException(f"@@ partition must be 'day' or 'month'")
+        query = dict(
+            namespace_id=namespace_id,
+            dataview_id=dataview_id,
+            start_index=start_index,
+            end_index=end_index,
+            interval="" if stored else interval,
+            stored=stored,
+            partition=partition,
+        )
+        export = DataviewExport(path, query)
+        step = pd.Timedelta(0) if stored else interval_timedelta(interval)
+
+        start_time = time.time()
+        written = skipped = 0
+        for name, range_start, range_end, before in partition_ranges(
+            utc_timestamp(start_index), utc_timestamp(end_index), step, partition
+        ):
+            if export.done(name):
+                skipped += 1
+                continue
+            writer = export.writer(name, partition, stored)
+            try:
+                for _, page in self.__dataview_pages(
+                    namespace_id,
+                    dataview_id,
+                    index_string(range_start),
+                    index_string(range_end),
+                    interval,
+                    count,
+                    stored,
+                ):
+                    if before is not None:
+                        page = page[page["Timestamp"] < before]
+                    writer.write(page)
+                    print("+", end="", flush=True)
+            except BaseException:
+                writer.abort()
+                raise
+            export.complete(name, writer, writer.close())
+            written += 1
+        print()
+        return dict(
+            export.totals(),
+            partitions=written,
+            skipped_partitions=skipped,
+            seconds=time.time() - start_time,
+        )
+
     def __stream_ops(self, kind, namespace, stream_id="", extra_args=None):
         q_values = dict(namespace=namespace, stream_id=stream_id)
         if extra_args:
@@ -670,33 +1845,85 @@ class HubClient:
         try:
             reply = self.graphql_query(stream_queries[kind], q_values)
         except Exception as e:
-            ed = ast.literal_eval(str(e))
-            if "404:" in ed["message"] or "400:" in ed["message"]:
-                raise GraphQLException(ed["extensions"]["message"]) from None
-            else:
-                raise e from None
+            raise stream_exception(e) from None
 
-        if len(reply["namespaces"]) == 0:
-            raise GraphQLException(
-                f"@@@ Namespace `{namespace}` not found (check hub.datasets())"
-            )
+        return check_namespace_reply(reply, namespace)
 
-        return reply
+    def __get_streams_page(self, namespace, query, count, skip):
+        reply = self.__stream_ops(
+            "streams", namespace, "", get_streams_args(query, count, skip)
+        )
+        return reply["namespaces"][0]["streams"]
 
     @hub_authenticated
     @typechecked
     def get_streams(
         self, namespace: str, query: str = "", count: int = 0, skip: int = 0
     ):
-        args = dict(count=2000)
-        if query:
-            args["query"] = query
-        if count:
-            args["count"] = count
-        if skip:
-            args["skip"] = skip
-        reply = self.__stream_ops("streams", namespace, "", args)
-        return reply["namespaces"][0]["streams"]
+        if self.__stream_catalog is not None:
+            streams = self.__stream_catalog.streams(namespace)
+            if streams is None:
+                streams = self.refresh_stream_catalog(namespace)
+            found = match_streams(streams, query)
+            if found is not None:
+                return found[skip : skip + (count or STREAM_PAGE_SIZE)]
+        return self.__get_streams_page(namespace, query, count, skip)
+
+    @hub_authenticated
+    @typechecked
+    def iter_streams(
+        self, namespace: str, query: str = "", page_size: int = STREAM_PAGE_SIZE
+    ):
+        """Yield all the streams matching `query`, reading them page after page
+        from the gateway; the next page is requested while the current one is
+        consumed"""
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            skip = 0
+            future = pool.submit(
+                self.__get_streams_page, namespace, query, page_size, skip
+            )
+            try:
+                while future is not None:
+                    page = future.result()
+                    skip += len(page)
+                    future = (
+                        pool.submit(
+                            self.__get_streams_page, namespace, query, page_size, skip
+                        )
+                        if len(page) == page_size
+                        else None
+                    )
+                    yield from page
+            finally:
+                if future is not None:
+                    future.cancel()
+
+    @typechecked
+    def enable_stream_catalog(
+        self, ttl: int = STREAM_CATALOG_TTL, directory: str = STREAM_CATALOG_DIR
+    ) -> None:
+        """Answer get_streams() from a local copy of all the streams of each
+        namespace, read again from the gateway after `ttl` seconds. Queries
+        with terms on any field (also searched in metadata and tags) or on
+        fields missing from stream records still go to the gateway."""
+        self.__stream_catalog = StreamCatalog(directory, ttl)
+
+    @typechecked
+    def disable_stream_catalog(self) -> None:
+        self.__stream_catalog = None
+
+    @typechecked
+    def clear_stream_catalog(self, namespace: str = None) -> None:
+        if self.__stream_catalog is not None:
+            self.__stream_catalog.clear(namespace)
+
+    @hub_authenticated
+    @typechecked
+    def refresh_stream_catalog(self, namespace: str) -> list:
+        streams = list(self.iter_streams(namespace))
+        catalog = self.__stream_catalog or StreamCatalog()
+        catalog.save(namespace, streams)
+        return streams
 
     @hub_authenticated
     @typechecked
@@ -708,12 +1935,24 @@ class HubClient:
     @typechecked
     def get_stream_ends(self, namespace: str, stream_id):
         reply = self.__stream_ops("ends", namespace, stream_id)["namespaces"][0]
-        return (
-            parse(reply["first"]["Timestamp"]),
-            reply["first"].get("Value", None),
-            parse(reply["last"]["Timestamp"]),
-            reply["last"].get("Value", None),
-        )
+        return stream_ends(reply)
+
+    @hub_authenticated
+    @typechecked
+    def get_streams_ends(self, namespace: str, stream_ids: List[str]) -> dict:
+        try:
+            replies = self.graphql_batch(
+                q_stream_ends,
+                [dict(namespace=namespace, stream_id=i) for i in stream_ids],
+            )
+        except Exception as e:
+            raise stream_exception(e) from None
+        return {
+            stream_id: stream_ends(
+                check_namespace_reply(reply, namespace)["namespaces"][0]
+            )
+            for stream_id, reply in zip(stream_ids, replies)
+        }
 
     @hub_authenticated
     @typechecked
@@ -723,13 +1962,7 @@ class HubClient:
         reply = self.__stream_ops(
             "data", namespace, stream_id, dict(start=start, end=end)
         )
-        df = pd.DataFrame(reply["namespaces"][0]["data"])
-        if len(df) > 0:
-            time_column = list(df.columns)[0]
-            df[time_column] = pd.to_datetime(df[time_column])
-            if column_name:
-                df.columns = [time_column, column_name]
-        return df
+        return stream_window_frame(reply["namespaces"][0]["data"], column_name)
 
     @hub_authenticated
     @typechecked
@@ -743,30 +1976,125 @@ class HubClient:
         column_name: str = "",
         raw: bool = False,
     ):
-        try:
-            t_interval = datetime.strptime(interval, "%H:%M:%S")
-            delta = t_interval - parse("1900-01-01")
-            count = int((parse(end) - parse(start)) / delta) + 1
-        except ValueError as e:
-            raise GraphQLException(
-                f"@Error: start, end or interval (HH:MM:SS) has invalid format: {e}"
-            ) from None
-
+        count = stream_interpolated_count(start, end, interval)
         reply = self.__stream_ops(
             "interpolated",
             namespace,
             stream_id,
             dict(start=start, end=end, count=count),
         )
-        df = pd.DataFrame(reply["namespaces"][0]["data"])
-        if len(df) > 0:
-            time_column = list(df.columns)[0]
-            df[time_column] = pd.to_datetime(df[time_column])
-            if not raw:
-                df = df.drop(df.columns[2:], axis=1)
-            if column_name:
-                df.columns = [df.columns[0], column_name] + list(df.columns[2:])
-        return df
+        return stream_interpolated_frame(
+            reply["namespaces"][0]["data"], column_name, raw
+        )
+
+    def __streams_batch(
+        self, query, namespace, stream_ids, extra_args, batch_size, max_concurrency
+    ):
+        # streams packed `batch_size` per aliased query, queries sent at the
+        # same time; a stream not found (404) or refused (400) is reported in
+        # stream_errors() instead of failing the others
+        variables = [
+            dict(namespace=namespace, stream_id=stream_id, **extra_args)
+            for stream_id in stream_ids
+        ]
+        chunks = [
+            variables[first : first + batch_size]
+            for first in range(0, len(variables), batch_size)
+        ]
+        workers = max(1, min(max_concurrency, len(chunks)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(
+                    self.graphql_batch,
+                    query,
+                    chunk,
+                    return_errors=True,
+                    batch_size=batch_size,
+                )
+                for chunk in chunks
+            ]
+            replies = [reply for future in futures for reply in future.result()]
+
+        data = {}
+        errors = {}
+        for stream_id, reply in zip(stream_ids, replies):
+            if isinstance(reply, Exception):
+                error = stream_exception(reply)
+                if not isinstance(error, GraphQLException):
+                    raise error
+                errors[stream_id] = str(error)
+            else:
+                data[stream_id] = check_namespace_reply(reply, namespace)["namespaces"][
+                    0
+                ]["data"]
+        self.__stream_errors = errors
+        if len(errors) > 0:
+            print(f"@@ {len(errors)} stream(s) failed, see hub.stream_errors()")
+        return data
+
+    def stream_errors(self) -> dict:
+        """Errors of the streams of the last streams_*_pd() call, by stream id"""
+        return dict(self.__stream_errors)
+
+    @hub_authenticated
+    @typechecked
+    def streams_window_pd(
+        self,
+        namespace: str,
+        stream_ids: List[str],
+        start: str,
+        end: str,
+        as_dict: bool = False,
+        batch_size: int = MAX_BATCH_QUERIES,
+        max_concurrency: int = MAX_STREAM_CONCURRENCY,
+    ):
+        """Stored values of several streams, as one DataFrame with a column
+        per stream (outer join on time) or, with `as_dict`, a dict of
+        stream_window_pd() frames"""
+        data = self.__streams_batch(
+            q_stream_data,
+            namespace,
+            stream_ids,
+            dict(start=start, end=end),
+            batch_size,
+            max_concurrency,
+        )
+        frames = {
+            stream_id: stream_window_frame(values, stream_id)
+            for stream_id, values in data.items()
+        }
+        return frames if as_dict else join_stream_frames(frames.values())
+
+    @hub_authenticated
+    @typechecked
+    def streams_interpolated_pd(
+        self,
+        namespace: str,
+        stream_ids: List[str],
+        start: str,
+        end: str,
+        interval: str,
+        as_dict: bool = False,
+        batch_size: int = MAX_BATCH_QUERIES,
+        max_concurrency: int = MAX_STREAM_CONCURRENCY,
+    ):
+        """Interpolated values of several streams on the same time grid, as
+        one DataFrame with a column per stream or, with `as_dict`, a dict of
+        stream_interpolated_pd() frames"""
+        count = stream_interpolated_count(start, end, interval)
+        data = self.__streams_batch(
+            q_stream_interpolated,
+            namespace,
+            stream_ids,
+            dict(start=start, end=end, count=count),
+            batch_size,
+            max_concurrency,
+        )
+        frames = {
+            stream_id: stream_interpolated_frame(values, stream_id, False)
+            for stream_id, values in data.items()
+        }
+        return frames if as_dict else join_stream_frames(frames.values())
 
     @hub_authenticated
     @typechecked
@@ -775,12 +2103,51 @@ class HubClient:
         hub_data: str = "hub_datasets.json",
         additional_status: str = "production",
         experimental: bool = True,
+        full: bool = False,
     ) -> None:
-        db = self.graphql_query(
-            q_datasets, variable_values={"status": additional_status}
+        """Update `hub_data` from the gateway and use it: only the databases
+        with a new version (or none) are read again, all with `full`"""
+        versions = self.graphql_query(
+            q_database_versions, variable_values={"status": additional_status}
+        )["Database"]
+        current = load_catalog(hub_data) if os.path.isfile(hub_data) else None
+        known = {} if full or current is None else current.versions()
+        changed = [
+            version["id"]
+            for version in versions
+            if version.get("version") is None
+            or known.get(version["id"]) != version_key(version)
+        ]
+        if current is not None and len(changed) == 0 and len(known) == len(versions):
+            catalog = current
+        else:
+            replies = (
+                self.graphql_batch(q_database, [{"id": i} for i in changed])
+                if len(changed) > 0
+                else []
+            )
+            databases = [
+                database for reply in replies for database in reply["Database"]
+            ]
+            catalog = (current or self.__catalog).merged(versions, databases)
+            save_catalog(hub_data, catalog)
+        removed = len(set(known) - {version["id"] for version in versions})
+        print(
+            f"@ {len(changed)} of {len(versions)} datasets updated"
+            + (f", {removed} removed" if removed else "")
+            + f" in {hub_data}"
         )
-        with open(hub_data, "w") as f:
-            f.write(json.dumps(db, indent=2))
+        self.__use_catalog(catalog)
+
+    def __use_catalog(self, catalog):
+        self.__catalog = catalog
+        self.__gqlh = catalog.gqlh
+        self.__db_index = catalog.db_index
+        hub_db_namespaces.clear()
+        hub_db_namespaces.update(catalog.namespaces)
+        if self.__current_db not in self.__db_index:
+            self.__current_db = catalog.first_db()
+        self.__current_db_index = self.__db_index[self.__current_db]
 
     def graphql_query(self, query_string, variable_values=None):
         if self.__graphql_client is None:
@@ -789,15 +2156,63 @@ class HubClient:
             )
         if variable_values is None:
             variable_values = {}
-        query = gql(query_string)
-        try:
-            reply = self.__graphql_client.execute(
-                query, variable_values=variable_values
-            )
-        except Exception as e:
-            raise e
+        query = gql_document(query_string)
+        client = self.__graphql_client
+
+        # identical queries in flight (widget callbacks, re-run cells) are
+        # sent once, their callers get copies of the reply
+        def execute():
+            return client.execute(query, variable_values=variable_values)
+
+        reply, shared = self.__flights.run(
+            request_key(query_string, variable_values), execute
+        )
+        if shared:
+            self.__metrics.inc("hub_coalesced_requests_total")
         return reply
 
+    def graphql_batch(
+        self,
+        query_string,
+        variable_values_list,
+        return_errors=False,
+        batch_size=MAX_BATCH_QUERIES,
+    ):
+        """Run a query once per variables dict, packing up to `batch_size` of
+        them per request with field aliases. Replies are in the same order;
+        with `return_errors`, a failed query gives its exception instead of
+        raising it."""
+        if self.__graphql_client is None:
+            raise GraphQLException(
+                "@@@ Please (re)start Hub login sequence (cell with hub_login() )"
+            )
+        replies = []
+        for first in range(0, len(variable_values_list), batch_size):
+            chunk = variable_values_list[first : first + batch_size]
+            document, keys = batch_document(query_string, len(chunk))
+            result = self.__graphql_client.transport.execute(
+                document, variable_values=batch_variables(chunk)
+            )
+            errors = {}
+            for error in result.errors or []:
+                path = error.get("path") if isinstance(error, dict) else None
+                alias = path[0] if path else None
+                errors.setdefault(alias, Exception(str(error)))
+            if None in errors and not return_errors:
+                raise errors[None]
+            data = result.data or {}
+            for copy_keys in keys:
+                error = next(
+                    (errors[a] for a, _ in copy_keys if a in errors), errors.get(None)
+                )
+                if error is not None:
+                    if not return_errors:
+                        raise error
+                    replies.append(error)
+                else:
+                    replies.append({key: data[alias] for alias, key in copy_keys})
+        return replies
+
 
 def set_token_and_check(hub, jwt, custom_url):
     hub.set_jwt(jwt, custom_url)
@@ -0,0 +1,213 @@
+#
+import numpy as np
+import pandas as pd
+
+from .util import HubException
+
+AGGREGATES = ["min", "max", "mean", "first", "last"]
+GROUP_COLUMNS = ["Asset_Id", "Field"]
+# LTTB picks among the min/max points of LTTB_RATIO times more buckets
+LTTB_RATIO = 4
+
+
+def group_columns(df):
+    return [column for column in GROUP_COLUMNS if column in df.columns]
+
+
+def numeric_values(df, by):
+    """Timestamp, `by` and the value columns as floats (digital states and
+    other text dropped: they cannot be aggregated nor plotted as a line)"""
+    values = {}
+    for column in df.columns:
+        if column == "Timestamp" or column in by or column.endswith("__ds"):
+            continue
+        numbers = pd.to_numeric(df[column], errors="coerce")
+        if numbers.notna().any() or pd.api.types.is_numeric_dtype(df[column]):
+            values[column] = numbers.astype("float64")
+    return pd.DataFrame(
+        {"Timestamp": df["Timestamp"], **{c: df[c] for c in by}, **values}
+    )
+
+
+def bucket_ids(timestamps, start, width):
+    return ((timestamps - start) // width).to_numpy(dtype="int64")
+
+
+def lttb_indices(x, y, points):
+    """Largest-Triangle-Three-Buckets: positions of `points` of (x, y) which
+    keep the shape of the line, first and last included"""
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n) if points >= n else np.array([0, n - 1][:points])
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    # bucket i + 1 of the n - 2 inner points, as in the reference algorithm
+    edges = np.floor(np.linspace(1, n - 1, points - 1)).astype("int64")
+    selected = np.empty(points, dtype="int64")
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(points - 2):
+        lower, upper = edges[i], edges[i + 1]
+        following = slice(upper, edges[i + 2] if i + 2 < len(edges) else n)
+        avg_x = x[following].mean()
+        avg_y = y[following].mean()
+        areas = np.abs(
+            (x[a] - avg_x) * (y[lower:upper] - y[a])
+            - (x[a] - x[lower:upper]) * (avg_y - y[a])
+        )
+        a = lower + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+class BucketDownsampler:
+    """Aggregates of the values of each time bucket of `width` from `start`,
+    computed page by page: only the partial aggregates of the buckets are
+    kept, never the pages"""
+
+    def __init__(self, start, width, how=("mean",), by=None):
+        how = [how] if isinstance(how, str) else list(how)
+        unknown = set(how) - set(AGGREGATES)
+        if unknown or len(how) == 0:
+            raise HubException(
+                f"@@ downsampling aggregates are {AGGREGATES}, got {sorted(unknown)}"
+            )
+        self.start = start
+        self.width = width
+        self.how = how
+        self.by = by
+        self.__partials = []
+
+    def add(self, page):
+        if len(page) == 0:
+            return
+        if self.by is None:
+            self.by = group_columns(page)
+        df = numeric_values(page, self.by)
+        df["bucket"] = bucket_ids(df["Timestamp"], self.start, self.width)
+        values = [c for c in df.columns if c not in ["Timestamp", "bucket"] + self.by]
+        groups = df.groupby(self.by + ["bucket"], sort=False)[values]
+        partial = pd.concat(
+            {
+                "min": groups.min(),
+                "max": groups.max(),
+                "sum": groups.sum(),
+                "count": groups.count(),
+                "first": groups.first(),
+                "last": groups.last(),
+            },
+            axis=1,
+        )
+        self.__partials.append(partial)
+        if len(self.__partials) > 16:
+            self.__partials = [self.__merge()]
+
+    def __merge(self):
+        # partials are in time order: first of the firsts, last of the lasts
+        df = pd.concat(self.__partials)
+        levels = list(range(df.index.nlevels))
+        merge = {"min": "min", "max": "max", "sum": "sum", "count": "sum"}
+        merge.update({"first": "first", "last": "last"})
+        return pd.concat(
+            {
+                stat: df[stat].groupby(level=levels, sort=False).agg(how)
+                for stat, how in merge.items()
+            },
+            axis=1,
+        )
+
+    def result(self):
+        """One row per bucket (and group), Timestamp at the bucket start; with
+        several aggregates, columns are named `<column>__<aggregate>`"""
+        if len(self.__partials) == 0:
+            return pd.DataFrame()
+        partial = self.__merge()
+        columns = {}
+        for how in self.how:
+            if how == "mean":
+                values = partial["sum"] / partial["count"]
+            else:
+                values = partial[how]
+            for column in values.columns:
+                name = column if len(self.how) == 1 else f"{column}__{how}"
+                columns[name] = values[column]
+        df = pd.DataFrame(columns).reset_index()
+        df.insert(0, "Timestamp", self.start + df.pop("bucket") * self.width)
+        return df.sort_values(self.by + ["Timestamp"]).reset_index(drop=True)
+
+
+class LTTBDownsampler:
+    """About `points` rows of each column (and group) of [start, end] picked
+    by LTTB. Pages are reduced as they come to the rows holding the min or
+    max of a column in buckets LTTB_RATIO times smaller, which LTTB then
+    chooses from; the result has the rows picked for any column."""
+
+    def __init__(self, start, end, points, by=None, ratio=LTTB_RATIO):
+        self.start = start
+        self.points = points
+        self.by = by
+        self.__width = max((end - start) / (points * ratio), pd.Timedelta(1))
+        self.__candidates = []
+
+    def __preselect(self, df):
+        df = df.reset_index(drop=True)
+        buckets = bucket_ids(df["Timestamp"], self.start, self.__width)
+        values = [c for c in df.columns if c != "Timestamp" and c not in self.by]
+        rows = []
+        for column in values:
+            # without the missing values of the column: a bucket (or a field
+            # of stored rows) can have none
+            valid = df[column].notna().to_numpy()
+            keys = [df.loc[valid, c] for c in self.by] + [buckets[valid]]
+            groups = df.loc[valid, column].groupby(keys, sort=False)
+            rows += [groups.idxmin().to_numpy(), groups.idxmax().to_numpy()]
+        rows = np.unique(np.concatenate(rows).astype("int64")) if rows else []
+        return df.iloc[rows]
+
+    def add(self, page):
+        if len(page) == 0:
+            return
+        if self.by is None:
+            self.by = group_columns(page)
+        self.__candidates.append(self.__preselect(numeric_values(page, self.by)))
+        if len(self.__candidates) > 16:
+            self.__candidates = [self.__preselect(pd.concat(self.__candidates))]
+
+    def result(self):
+        if len(self.__candidates) == 0:
+            return pd.DataFrame()
+        df = pd.concat(self.__candidates).sort_values(self.by + ["Timestamp"])
+        df = df.reset_index(drop=True)
+        values = [c for c in df.columns if c != "Timestamp" and c not in self.by]
+        x = ((df["Timestamp"] - self.start) / pd.Timedelta(seconds=1)).to_numpy()
+        selected = []
+        groups = df.groupby(self.by, sort=False).indices if self.by else {0: None}
+        for rows in groups.values():
+            rows = np.arange(len(df)) if rows is None else rows
+            for column in values:
+                y = df[column].to_numpy()[rows]
+                valid = rows[~np.isnan(y)]
+                picked = lttb_indices(x[valid], y[~np.isnan(y)], self.points)
+                selected.append(valid[picked])
+        rows = np.unique(np.concatenate(selected)) if selected else []
+        return df.iloc[rows].reset_index(drop=True)
+
+
+def downsampler(start, end, points, how="mean", by=None):
+    """BucketDownsampler of `points` buckets over [start, end], or an
+    LTTBDownsampler for how="lttb"""
+    if how == "lttb":
+        return LTTBDownsampler(start, end, points, by)
+    width = max((end - start) / points, pd.Timedelta(1))
+    return BucketDownsampler(start, width, how, by)
+
+
+def downsample_frame(df, points, how="mean", by=None):
+    """Downsample an already fetched frame"""
+    if len(df) == 0:
+        return df
+    start, end = df["Timestamp"].min(), df["Timestamp"].max()
+    reducer = downsampler(start, end, points, how, by)
+    reducer.add(df)
+    return reducer.result()
@@ -0,0 +1,163 @@
+#
+import os
+import uuid
+
+import pandas as pd
+
+from .cache import TEXT_SUFFIX, _read_json, _write_json, split_mixed_columns
+from .util import HubException
+
+# names starting with "_" or "." are skipped by Parquet dataset readers
+MANIFEST_FILE = "_manifest.json"
+PARTITION_FORMATS = {"day": "%Y-%m-%d", "month": "%Y-%m"}
+
+
+def partition_bounds(start, end, partition):
+    """Partition start times covering [start, end], plus the one after end"""
+    if partition == "day":
+        first = start.floor("D")
+        offset = pd.DateOffset(days=1)
+    else:
+        first = start.floor("D").replace(day=1)
+        offset = pd.DateOffset(months=1)
+    bounds = [first]
+    while bounds[-1] <= end:
+        bounds.append(bounds[-1] + offset)
+    return bounds
+
+
+def partition_ranges(start, end, step, partition):
+    """(name, start, end, before) of each partition of [start, end]: interpolated
+    (non-zero `step`) partitions hold the grid points of their period, stored
+    ones share their boundary and keep rows `before` it"""
+    ranges = []
+    bounds = partition_bounds(start, end, partition)
+    for lower, upper in zip(bounds[:-1], bounds[1:]):
+        name = lower.strftime(PARTITION_FORMATS[partition])
+        range_start = max(start, lower)
+        if step:
+            range_start = start + -((start - range_start) // step) * step
+            range_end = min(end, start + ((upper - start) // step) * step)
+            if range_end == upper:
+                range_end -= step
+            if range_start <= range_end:
+                ranges.append((name, range_start, range_end, None))
+        else:
+            before = upper if upper <= end else None
+            ranges.append((name, range_start, min(end, upper), before))
+    return ranges
+
+
+class PartitionWriter:
+    """One Parquet file per partition, written one row group per page and
+    renamed in place when complete. Values mixed with digital states are
+    written as a numeric and a `<column>|text` column (see
+    split_mixed_columns), in every page once split in one: stored `Value`
+    always."""
+
+    def __init__(self, path, stored=False):
+        import pyarrow.parquet as pq
+
+        self.path = path
+        self.rows = 0
+        self.pages = 0
+        self.__pq = pq
+        directory, name = os.path.split(path)
+        self.__tmp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex}.tmp")
+        self.__writer = None
+        self.__schema = None
+        self.__mixed = ["Value"] if stored else []
+
+    def write(self, df):
+        import pyarrow as pa
+
+        if len(df) == 0:
+            return
+        df, mixed = split_mixed_columns(df, self.__mixed)
+        if self.__writer is None:
+            self.__mixed = mixed
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            # columns without any value in the first page: strings
+            self.__schema = pa.schema(
+                [
+                    field.with_type(pa.string())
+                    if pa.types.is_null(field.type)
+                    else field
+                    for field in table.schema
+                ]
+            )
+            table = table.cast(self.__schema)
+            self.__writer = self.__pq.ParquetWriter(self.__tmp_path, self.__schema)
+        else:
+            # a file has one schema: a column first mixed after the first page
+            # would lose its text column
+            for column in mixed:
+                if column + TEXT_SUFFIX not in self.__schema.names:
+                    raise HubException(
+                        f"@@ {column} of {self.path} mixes numbers and text "
+                        f"only from page {self.pages + 1} on"
+                    )
+            table = pa.Table.from_pandas(df, schema=self.__schema, preserve_index=False)
+        self.__writer.write_table(table)
+        self.rows += len(df)
+        self.pages += 1
+
+    def close(self):
+        """Return the size of the file, 0 if there was no row to write"""
+        if self.__writer is None:
+            return 0
+        self.__writer.close()
+        os.replace(self.__tmp_path, self.path)
+        return os.path.getsize(self.path)
+
+    def abort(self):
+        if self.__writer is not None:
+            self.__writer.close()
+            os.remove(self.__tmp_path)
+
+
+class DataviewExport:
+    """Partitioned Parquet export under `path`, with a manifest of the finished
+    partitions so that the same export called again resumes after them"""
+
+    def __init__(self, path, query):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HubException(
+                "@@ Dataview export requires pyarrow (pip install pyarrow)"
+            ) from None
+        self.path = path
+        self.__manifest_path = os.path.join(path, MANIFEST_FILE)
+        manifest = _read_json(self.__manifest_path)
+        if manifest is None:
+            manifest = {"query": query, "partitions": {}}
+        elif manifest["query"] != query:
+            raise HubException(
+                f"@@ {path} holds an export of another query, use a new path"
+            )
+        self.manifest = manifest
+
+    def done(self, name):
+        return name in self.manifest["partitions"]
+
+    def writer(self, name, partition, stored=False):
+        file = os.path.join(f"{partition}={name}", "part-0.parquet")
+        return PartitionWriter(os.path.join(self.path, file), stored)
+
+    def complete(self, name, writer, size):
+        self.manifest["partitions"][name] = {
+            "file": os.path.relpath(writer.path, self.path) if size > 0 else None,
+            "rows": writer.rows,
+            "pages": writer.pages,
+            "bytes": size,
+        }
+        os.makedirs(self.path, exist_ok=True)
+        _write_json(self.__manifest_path, self.manifest)
+
+    def totals(self):
+        partitions = self.manifest["partitions"].values()
+        return {
+            key: sum(p[key] for p in partitions) for key in ["rows", "bytes", "pages"]
+        }
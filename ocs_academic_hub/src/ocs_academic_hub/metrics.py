@@ -0,0 +1,211 @@
+#
+import json
+import math
+import threading
+
+import pandas as pd
+
+# upper bounds (seconds) of the latency histogram buckets, +Inf is implicit
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+METRICS = {
+    "hub_call_seconds": ("histogram", "Runtime of HubClient data calls"),
+    "hub_call_rows_total": ("counter", "Rows returned by HubClient data calls"),
+    "hub_call_errors_total": ("counter", "HubClient data calls which raised"),
+    "hub_page_seconds": ("histogram", "Gateway request time of dataview pages"),
+    "hub_page_rows_total": ("counter", "Rows received in dataview pages"),
+    "hub_requests_total": ("counter", "Gateway HTTP replies, by status code"),
+    "hub_response_bytes_total": ("counter", "Bytes of gateway HTTP replies"),
+    "hub_wire_bytes_total": ("counter", "Bytes received, before decompression"),
+    "hub_retries_total": ("counter", "Gateway errors retried, by status"),
+    "hub_errors_total": ("counter", "Gateway errors raised, by status"),
+    "hub_page_size_changes_total": ("counter", "Dataview page count changes"),
+    "hub_cache_lookups_total": ("counter", "Dataview cache lookups, by result"),
+    "hub_coalesced_requests_total": (
+        "counter",
+        "Gateway queries answered by an identical one in flight",
+    ),
+}
+
+
+def label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def label_string(key):
+    return ",".join(
+        '{}="{}"'.format(name, value.replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in key
+    )
+
+
+class Histogram:
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.bounds) and value > self.bounds[i]:
+            i += 1
+        self.buckets[i] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate from the buckets, linear within the bucket (as Prometheus)
+        and within the observed values"""
+        if self.count == 0:
+            return math.nan
+        rank = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.buckets):
+            if n > 0 and cumulative + n >= rank:
+                lower = max(self.bounds[i - 1] if i > 0 else 0.0, self.min)
+                upper = min(
+                    self.bounds[i] if i < len(self.bounds) else self.max, self.max
+                )
+                return lower + (upper - lower) * (rank - cumulative) / n
+            cumulative += n
+        return self.max
+
+    def to_dict(self):
+        return {
+            "buckets": list(self.buckets),
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count > 0 else 0.0,
+            "max": self.max,
+        }
+
+    def merge(self, state):
+        for i, n in enumerate(state["buckets"]):
+            self.buckets[i] += n
+        self.count += state["count"]
+        self.sum += state["sum"]
+        if state["count"] > 0:
+            self.min = min(self.min, state.get("min", 0.0))
+        self.max = max(self.max, state["max"])
+
+
+class MetricsRegistry:
+    """Counters and latency histograms of the gateway traffic of a client,
+    labelled by call, read mode or status. Thread safe, since pages of a
+    parallel read are recorded from worker threads."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__counters = {}
+        self.__histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, label_key(labels))
+        with self.__lock:
+            self.__counters[key] = self.__counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, label_key(labels))
+        with self.__lock:
+            histogram = self.__histograms.get(key, None)
+            if histogram is None:
+                histogram = self.__histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def reset(self):
+        with self.__lock:
+            self.__counters.clear()
+            self.__histograms.clear()
+
+    def frame(self):
+        """One row per metric and labels: counters have their `value`,
+        histograms `count`, `sum`, `mean`, estimated quantiles and `max`"""
+        rows = []
+        with self.__lock:
+            for (name, key), value in self.__counters.items():
+                rows.append(
+                    {"metric": name, "labels": label_string(key), "value": value}
+                )
+            for (name, key), histogram in self.__histograms.items():
+                rows.append(
+                    {
+                        "metric": name,
+                        "labels": label_string(key),
+                        "value": histogram.sum,
+                        "count": histogram.count,
+                        "mean": histogram.sum / histogram.count,
+                        "p50": histogram.quantile(0.5),
+                        "p90": histogram.quantile(0.9),
+                        "p99": histogram.quantile(0.99),
+                        "max": histogram.max,
+                    }
+                )
+        columns = ["metric", "labels", "value", "count", "mean"]
+        columns += ["p50", "p90", "p99", "max"]
+        return (
+            pd.DataFrame(rows, columns=columns)
+            .sort_values(["metric", "labels"])
+            .reset_index(drop=True)
+        )
+
+    def to_dict(self):
+        with self.__lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(key), "value": value}
+                    for (name, key), value in self.__counters.items()
+                ],
+                "histograms": [
+                    {"name": name, "labels": dict(key), **histogram.to_dict()}
+                    for (name, key), histogram in self.__histograms.items()
+                ],
+            }
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    def merge(self, state):
+        """Add the metrics of `to_dict()` from another client or kernel"""
+        for counter in state["counters"]:
+            self.inc(counter["name"], counter["value"], **counter["labels"])
+        with self.__lock:
+            for item in state["histograms"]:
+                key = (item["name"], label_key(item["labels"]))
+                histogram = self.__histograms.get(key, None)
+                if histogram is None:
+                    histogram = self.__histograms[key] = Histogram()
+                histogram.merge(item)
+
+    def to_prometheus(self, extra_labels=None):
+        """Prometheus text exposition format, `extra_labels` (e.g. the kernel
+        or user) added to every sample"""
+        extra = label_key(extra_labels or {})
+        samples = {}
+        with self.__lock:
+            for (name, key), value in sorted(self.__counters.items()):
+                samples.setdefault(name, []).append(
+                    f"{name}{{{label_string(key + extra)}}} {value}"
+                )
+            for (name, key), histogram in sorted(self.__histograms.items()):
+                lines = samples.setdefault(name, [])
+                cumulative = 0
+                bounds = [str(b) for b in histogram.bounds] + ["+Inf"]
+                for bound, n in zip(bounds, histogram.buckets):
+                    cumulative += n
+                    labels = label_string(key + extra + (("le", bound),))
+                    lines.append(f"{name}_bucket{{{labels}}} {cumulative}")
+                labels = label_string(key + extra)
+                lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        text = []
+        for name in sorted(samples):
+            kind, help_text = METRICS.get(name, ("untyped", name))
+            text.append(f"# HELP {name} {help_text}")
+            text.append(f"# TYPE {name} {kind}")
+            text.extend(samples[name])
+        return "\n".join(text) + "\n"
@@ -20,6 +20,7 @@ from gql.transport.requests import RequestsHTTPTransport
 from requests.structures import CaseInsensitiveDict
 from typeguard import typechecked
 
+from .catalog import download_catalog
 from .util import timer
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -620,12 +621,10 @@ class HubClient(OCSClient):
             self.refresh_datasets_experimental(hub_data, additional_status, **kwargs)
         else:
             db_file = f"{hub_data.replace('.json', '')}-{additional_status}.json"
-            db = requests.get(base_url + db_file)
-            if db.status_code == 200:
-                with open(hub_data, "w") as f:
-                    f.write(json.dumps(db.json(), indent=2))
-
-            else:
+            status = download_catalog(base_url + db_file, hub_data)
+            if status == 304:
+                print(f"@ Hub data file {hub_data} is up to date")
+            elif status != 200:
                 print(
                     f"!!! Error getting data file {db_file} at {base_url}: datasets info not updated, please retry"
                 )
@@ -0,0 +1,218 @@
+#
+import os
+import queue
+import threading
+import time
+
+from .cache import DEFAULT_CACHE_DIR, _read_json, _write_json
+
+PAGE_SIZES_FILE = os.path.join(DEFAULT_CACHE_DIR, "page_sizes.json")
+MIN_PAGE_COUNT = 40
+GROW_AFTER_PAGES = 4
+# a count which timed out is not tried again for a day: the gateway load
+# changes, a ceiling kept for good would only ever go down
+CEILING_TTL = 24 * 3600
+PREFETCH_DEPTH = 2
+
+_store = None
+_store_lock = threading.Lock()
+
+
+class PageSizeStore:
+    """Last good page count of each dataview read mode, with the lowest count
+    which timed out, kept in a small JSON file so that a new session starts
+    with them instead of timing out again"""
+
+    def __init__(self, path=PAGE_SIZES_FILE):
+        self.path = path
+        self.__lock = threading.Lock()
+        self.__counts = None
+
+    def __load(self):
+        if self.__counts is None:
+            self.__counts = _read_json(self.path) or {}
+        return self.__counts
+
+    def get(self, key):
+        """Return (count, ceiling, time the ceiling timed out), (0, None, None)
+        if unknown; an expired ceiling is None"""
+        with self.__lock:
+            entry = self.__load().get(key, None)
+        if not isinstance(entry, dict):
+            return 0, None, None
+        since = entry.get("since", None)
+        if since is None or time.time() - since > CEILING_TTL:
+            return entry.get("count", 0), None, None
+        return entry.get("count", 0), entry.get("ceiling", None), since
+
+    def put(self, key, count, ceiling=None, since=None):
+        entry = {"count": count, "ceiling": ceiling, "since": since}
+        with self.__lock:
+            counts = self.__load()
+            if counts.get(key, None) == entry:
+                return
+            counts[key] = entry
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                _write_json(self.path, counts)
+            except OSError:
+                pass
+
+
+def page_size_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PageSizeStore()
+        return _store
+
+
+def page_size_key(namespace_id, dataview_id, stored):
+    # a dataview id can be found in several namespaces, with different widths
+    return f"{namespace_id}|{dataview_id}|{'stored' if stored else 'interpolated'}"
+
+
+class PageSizer:
+    """Page count of one dataview read, adapted AIMD style: halved on a 408
+    timeout, increased by a step after GROW_AFTER_PAGES complete pages in a row
+    but never back to a count which timed out less than CEILING_TTL ago. A
+    count of 0 lets the gateway choose."""
+
+    def __init__(self, key, count=0, store=None):
+        self.key = key
+        self.__store = page_size_store() if store is None else store
+        self.__changed = False
+        self.__ceiling = None
+        self.__step = 0
+        self.__pages = 0
+        self.count = 0
+        stored_count, self.__ceiling, self.__since = self.__store.get(key)
+        self.start(count if count > 0 else stored_count)
+        self.__changed = False
+
+    def start(self, count):
+        self.count = count
+        self.__step = max(MIN_PAGE_COUNT, count // 8)
+        self.__pages = 0
+        self.__changed = True
+
+    def timeout(self):
+        """Count for the next query after a 408 (below MIN_PAGE_COUNT: give up)"""
+        if self.__ceiling is None or self.count < self.__ceiling:
+            self.__ceiling = self.count
+        self.__since = time.time()
+        self.start(self.count // 2)
+        if self.count >= MIN_PAGE_COUNT:
+            self.__store.put(self.key, self.count, self.__ceiling, self.__since)
+        return self.count
+
+    def success(self, rows):
+        """Record a page of `rows`: True when the count was increased"""
+        if self.count == 0 or rows < self.count:
+            self.__pages = 0
+            return False
+        self.__pages += 1
+        if self.__pages < GROW_AFTER_PAGES:
+            return False
+        self.__pages = 0
+        count = self.count + self.__step
+        if self.__ceiling is not None:
+            count = min(count, self.__ceiling - self.__step)
+        if count <= self.count:
+            return False
+        self.count = count
+        self.__changed = True
+        return True
+
+    @property
+    def growing(self):
+        """True while success() can still increase the count"""
+        if self.count == 0:
+            return False
+        if self.__ceiling is None:
+            return True
+        return self.__ceiling - self.__step > self.count
+
+    def finish(self):
+        if self.__changed and self.count >= MIN_PAGE_COUNT:
+            self.__store.put(self.key, self.count, self.__ceiling, self.__since)
+
+
+class PagePrefetcher:
+    """Requests the pages following a page token in a background thread, up
+    to `depth` pages ahead of the caller: the gateway works on the next pages
+    while the caller parses the current one. A request of another query, or
+    of another token than the next one, is not prefetched."""
+
+    def __init__(self, depth=PREFETCH_DEPTH):
+        self.depth = depth
+        self.__query = None
+        self.__expected = None
+        self.__pages = None
+        self.__thread = None
+        self.__stopped = None
+
+    def take(self, query, next_page):
+        """Prefetched reply of (query, next_page), None if not prefetched; a
+        request which failed raises its exception"""
+        if self.__pages is None or (query, next_page) != (
+            self.__query,
+            self.__expected,
+        ):
+            return None
+        while True:
+            try:
+                reply, error = self.__pages.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if not self.__thread.is_alive() and self.__pages.empty():
+                    return None
+        if error is not None:
+            self.__expected = None
+            raise error
+        self.__expected = reply[0]
+        return reply
+
+    def start(self, query, next_page, fetch):
+        """Prefetch the pages of `query` from `next_page` on with
+        `fetch(token)`, unless already doing it"""
+        if next_page is None:
+            self.stop()
+            return
+        running = self.__thread is not None and self.__thread.is_alive()
+        if running and (query, next_page) == (self.__query, self.__expected):
+            return
+        self.stop()
+        self.__query, self.__expected = query, next_page
+        self.__pages = queue.Queue(maxsize=self.depth)
+        self.__stopped = threading.Event()
+        self.__thread = threading.Thread(
+            target=self.__run,
+            args=(next_page, fetch, self.__pages, self.__stopped),
+            daemon=True,
+        )
+        self.__thread.start()
+
+    @staticmethod
+    def __run(next_page, fetch, pages, stopped):
+        while next_page is not None and not stopped.is_set():
+            try:
+                reply, error = fetch(next_page), None
+            except Exception as e:
+                reply, error = None, e
+            # blocks while `depth` pages wait for the caller
+            while not stopped.is_set():
+                try:
+                    pages.put((reply, error), timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if error is not None or stopped.is_set():
+                return
+            next_page = reply[0]
+
+    def stop(self):
+        # a request in progress is left to finish, its reply is dropped
+        if self.__stopped is not None:
+            self.__stopped.set()
+        self.__query = self.__expected = self.__pages = self.__thread = None
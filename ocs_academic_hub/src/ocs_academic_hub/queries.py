@@ -1,5 +1,3 @@
-
-
 # Database alias to match previous file format
 q_datasets = """
 query datasets($status: String) {
@@ -36,6 +34,53 @@ query datasets($status: String) {
 }
 """
 
+q_database_versions = """
+query databaseVersions($status: String) {
+  Database: databases(
+    where: { OR: [{ status: "production" }, { status: $status }] }
+    options: { sort: [{ name: ASC }] }
+  ) {
+    name
+    asset_db
+    namespace
+    version
+    id
+  }
+}
+"""
+
+q_database = """
+query database($id: ID) {
+  Database: databases(where: { id: $id }) {
+    name
+    asset_db
+    description
+    informationURL
+    status
+    namespace
+    version
+    id
+    asset_with_dv(options: { sort: [{ name: ASC }] }) {
+      name
+      asset_id
+      description
+      asset_metadata
+      has_dataview(
+        where: { ocs_sync: true }
+        options: { sort: [{ name: ASC }] }
+      ) {
+        name
+        description
+        id
+        asset_id
+        columns
+        ocs_column_key
+      }
+    }
+  }
+}
+"""
+
 q_stored = """
 query stored(
   $id: ID
@@ -166,4 +211,4 @@ query {
     name
   }
 }
-"""
\ No newline at end of file
+"""
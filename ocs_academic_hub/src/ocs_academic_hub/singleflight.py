@@ -0,0 +1,61 @@
+#
+import copy
+import json
+import threading
+
+
+def request_key(query_string, variable_values):
+    """Same key for the same query, whatever its layout and variables order"""
+    return (
+        " ".join(query_string.split()),
+        json.dumps(variable_values, sort_keys=True, default=str),
+    )
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one execution: the first
+    caller runs it, the others wait for it. Each caller gets its own copy of
+    the result, or the exception raised."""
+
+    def __init__(self):
+        self.__flights = {}
+        self.__lock = threading.Lock()
+
+    def run(self, key, function):
+        """Result of `function()` and whether it came from another call"""
+        with self.__lock:
+            flight = self.__flights.get(key, None)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self.__flights[key] = flight
+            else:
+                flight.waiters += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result), True
+
+        try:
+            flight.result = function()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.__lock:
+                del self.__flights[key]
+                waiters = flight.waiters
+            flight.done.set()
+        # the waiters copy the result once woken: it is kept untouched
+        if waiters > 0:
+            return copy.deepcopy(flight.result), False
+        return flight.result, False
@@ -0,0 +1,233 @@
+#
+import hashlib
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import urllib.parse
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from .cache import DEFAULT_CACHE_DIR, _file_lock, _read_json, _write_json
+from .util import HubException
+
+# a directory shared by the kernels of a node (JupyterHub): set
+# HUB_SNAPSHOT_DIR to a folder all users can write to
+SNAPSHOT_DIR = os.environ.get(
+    "HUB_SNAPSHOT_DIR", os.path.join(DEFAULT_CACHE_DIR, "snapshots")
+)
+SNAPSHOT_WAIT = 3600
+MANIFEST_FILE = "manifest.json"
+LOCK_POLL = 1.0
+# a building kernel touches its lock this often: a lock left untouched for
+# LOCK_STALE seconds was left by a kernel which died
+LOCK_HEARTBEAT = 10.0
+LOCK_STALE = LOCK_HEARTBEAT * 6
+
+
+def snapshot_name(dataset, namespace_id, version, start, end, interval):
+    key = json.dumps([namespace_id, version, str(start), str(end), str(interval)])
+    return f"{dataset}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}"
+
+
+def _lock_owner():
+    return {"host": socket.gethostname(), "pid": os.getpid(), "time": time.time()}
+
+
+def _lock_is_stale(lock_path):
+    # left by a kernel which died: its process is gone or, on another host,
+    # its heartbeat stopped (a long build keeps its lock)
+    owner = _read_json(lock_path)
+    try:
+        untouched = time.time() - os.path.getmtime(lock_path)
+    except OSError:
+        return False
+    if owner is None:
+        return untouched > LOCK_POLL * 5
+    if owner["host"] != socket.gethostname():
+        return untouched > LOCK_STALE
+    try:
+        os.kill(owner["pid"], 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def _break_stale_lock(lock_path):
+    # decided and removed while holding the guard: a kernel which found the
+    # same stale lock cannot then remove the fresh one taken in its place
+    with _file_lock(f"{lock_path}.guard"):
+        if not _lock_is_stale(lock_path):
+            return False
+        print(f"@ removing stale snapshot lock {lock_path}")
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+        return True
+
+
+def _heartbeat(lock_path, done):
+    while not done.wait(LOCK_HEARTBEAT):
+        try:
+            os.utime(lock_path)
+        except OSError:
+            pass
+
+
+def _acquire_lock(lock_path):
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w") as f:
+        f.write(json.dumps(_lock_owner()))
+    return True
+
+
+def _write_table(path, table):
+    import pyarrow as pa
+
+    # uncompressed, so that readers map the columns instead of decoding them
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def build_snapshot(directory, name, manifest, read, timeout=SNAPSHOT_WAIT):
+    """Path of snapshot `name` in `directory`, built with `read(dataview_id)`
+    (a pyarrow.Table) for each dataview of the manifest when missing. One
+    kernel builds it while holding `<name>.lock`, the others wait for it. The
+    dataviews which could not be read are listed as `failed` in its
+    manifest."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    lock_path = f"{path}.lock"
+    waited = time.time()
+    while not os.path.isfile(os.path.join(path, MANIFEST_FILE)):
+        if not _acquire_lock(lock_path):
+            if _break_stale_lock(lock_path):
+                continue
+            if time.time() - waited > timeout:
+                raise HubException(
+                    f"@@ snapshot {name} still being built after {timeout} s, "
+                    f"remove {lock_path} if no kernel is building it"
+                )
+            time.sleep(LOCK_POLL)
+            continue
+        done = threading.Event()
+        threading.Thread(target=_heartbeat, args=(lock_path, done), daemon=True).start()
+        try:
+            if os.path.isfile(os.path.join(path, MANIFEST_FILE)):
+                break
+            # built aside, then renamed: readers never see a partial snapshot
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            os.makedirs(tmp_path)
+            try:
+                files = {}
+                failed = {}
+                for dataview_id in manifest["dataviews"]:
+                    file = urllib.parse.quote(dataview_id, safe="") + ".arrow"
+                    try:
+                        table = read(dataview_id)
+                    except Exception as e:
+                        print(f"\n@ dataview {dataview_id} left out of snapshot: {e}")
+                        failed[dataview_id] = str(e)
+                        continue
+                    _write_table(os.path.join(tmp_path, file), table)
+                    files[dataview_id] = file
+                    print("+", end="", flush=True)
+                if len(files) == 0 and len(failed) > 0:
+                    raise HubException(
+                        f"@@ snapshot {name}: no dataview could be read ({failed})"
+                    )
+                _write_json(
+                    os.path.join(tmp_path, MANIFEST_FILE),
+                    dict(manifest, dataviews=files, failed=failed, created=time.time()),
+                )
+                shutil.rmtree(path, ignore_errors=True)
+                os.rename(tmp_path, path)
+            except BaseException:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                raise
+        finally:
+            done.set()
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+    return path
+
+
+class DatasetSnapshot:
+    """Interpolated data of the dataviews of a dataset over [start, end], in
+    Arrow IPC files mapped in memory: the pages of a file are shared by all
+    the kernels of the node reading it"""
+
+    def __init__(self, path):
+        manifest = _read_json(os.path.join(path, MANIFEST_FILE))
+        if manifest is None:
+            raise HubException(f"@@ no dataset snapshot at {path}")
+        self.path = path
+        self.dataset = manifest["dataset"]
+        self.namespace_id = manifest["namespace"]
+        self.version = manifest["version"]
+        self.start = pd.Timestamp(manifest["start"])
+        self.end = pd.Timestamp(manifest["end"])
+        self.interval = manifest["interval"]
+        self.step = pd.Timedelta(manifest["step"])
+        self.files = manifest["dataviews"]
+        self.failed = manifest.get("failed", {})
+        self.__tables = {}
+        self.__times = {}
+        self.__lock = threading.Lock()
+
+    def table(self, dataview_id):
+        import pyarrow as pa
+
+        with self.__lock:
+            if dataview_id not in self.__tables:
+                source = pa.memory_map(os.path.join(self.path, self.files[dataview_id]))
+                table = pa.ipc.open_file(source).read_all()
+                if "Timestamp" in table.column_names:
+                    # converted once (ns, as pd.Timestamp.value): rows()
+                    # searches them at each read
+                    times = table["Timestamp"]
+                    times = times.cast(pa.timestamp("ns", tz=times.type.tz))
+                    self.__times[dataview_id] = times.cast("int64").to_numpy()
+                self.__tables[dataview_id] = table
+            return self.__tables[dataview_id]
+
+    def covers(self, namespace_id, dataview_id, start, end, step, version):
+        return (
+            namespace_id == self.namespace_id
+            and version == self.version
+            and dataview_id in self.files
+            and step == self.step
+            and self.start <= start
+            and end <= self.end
+            and (start - self.start) % step == pd.Timedelta(0)
+        )
+
+    def rows(self, dataview_id, start, end):
+        """Rows of [start, end], a zero-copy slice of the mapped table"""
+        table = self.table(dataview_id)
+        times = self.__times.get(dataview_id, None)
+        if times is None:
+            return table
+        first = np.searchsorted(times, start.value, side="left")
+        last = np.searchsorted(times, end.value, side="right")
+        return table.slice(first, last - first)
+
+    def __repr__(self):
+        return (
+            f"DatasetSnapshot({self.dataset}, {self.start}, {self.end}, "
+            f"{self.interval}, {len(self.files)} dataviews"
+            + (f", {len(self.failed)} failed)" if self.failed else ")")
+        )
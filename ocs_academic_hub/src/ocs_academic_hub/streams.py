@@ -0,0 +1,156 @@
+#
+import fnmatch
+import os
+import re
+import shlex
+import threading
+import time
+import urllib.parse
+
+from .cache import DEFAULT_CACHE_DIR, _read_json, _write_json
+
+STREAM_CATALOG_DIR = os.path.join(DEFAULT_CACHE_DIR, "streams")
+STREAM_CATALOG_TTL = 24 * 3600
+STREAM_PAGE_SIZE = 2000
+
+
+def term_matcher(pattern):
+    """Match of an OCS search term: with wildcards the whole value, without
+    any a whole word of it (text fields are searched by token)"""
+    pattern = pattern.lower()
+    if "*" in pattern or "?" in pattern:
+        regex = re.compile(fnmatch.translate(pattern), re.DOTALL)
+        return lambda value: regex.match(value.lower()) is not None
+    return lambda value: value.lower() == pattern or pattern in re.split(
+        r"[^0-9a-z]+", value.lower()
+    )
+
+
+def parse_stream_query(query, search_fields=None):
+    """OR of AND groups of (negated, fields, matcher) terms, None if the query
+    uses syntax which can only be answered by the gateway (parentheses,
+    ranges, metadata fields...). Terms without a field are searched in
+    `search_fields`, None when the stream records lack some of the fields the
+    gateway searches (metadata and tags)."""
+    if any(c in query for c in "()[]{}"):
+        return None
+    try:
+        tokens = shlex.split(query)
+    except ValueError:
+        return None
+    groups = [[]]
+    negated = False
+    for token in tokens:
+        if token == "OR":
+            groups.append([])
+        elif token == "AND":
+            continue
+        elif token == "NOT":
+            negated = True
+        else:
+            if token.startswith("-"):
+                negated, token = True, token[1:]
+            field, sep, pattern = token.partition(":")
+            if not sep and search_fields is None:
+                return None
+            fields = [field] if sep else search_fields
+            groups[-1].append((negated, fields, term_matcher(pattern or field)))
+            negated = False
+    return [group for group in groups if group]
+
+
+def match_streams(streams, query, search_fields=None):
+    """Streams matching `query`, None when it cannot be evaluated locally (see
+    parse_stream_query for `search_fields`)"""
+    if query.strip() in ["", "*"]:
+        return list(streams)
+    groups = parse_stream_query(query, search_fields)
+    if groups is None:
+        return None
+    keys = {key.lower() for stream in streams for key in stream}
+    for group in groups:
+        for _, fields, _ in group:
+            if fields is not search_fields and fields[0].lower() not in keys:
+                return None
+
+    def matches(stream):
+        items = {key.lower(): value for key, value in stream.items()}
+        return any(
+            all(
+                negated
+                != any(
+                    items.get(field.lower()) is not None
+                    and matcher(str(items[field.lower()]))
+                    for field in fields
+                )
+                for negated, fields, matcher in group
+            )
+            for group in groups
+        )
+
+    return [stream for stream in streams if matches(stream)]
+
+
+class StreamCatalog:
+    """All the streams of a namespace saved locally, searched offline by
+    get_streams() while younger than `ttl` seconds"""
+
+    def __init__(self, directory=STREAM_CATALOG_DIR, ttl=STREAM_CATALOG_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        # parsed snapshots with the modification time of their file
+        self.__snapshots = {}
+        self.__lock = threading.Lock()
+
+    def __path(self, namespace):
+        name = urllib.parse.quote(namespace, safe="")
+        return os.path.join(self.directory, f"{name}.json")
+
+    def streams(self, namespace):
+        """Saved streams of `namespace`, None if missing or expired"""
+        path = self.__path(namespace)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        with self.__lock:
+            cached = self.__snapshots.get(namespace, None)
+        if cached is not None and cached[0] == mtime:
+            snapshot = cached[1]
+        else:
+            snapshot = _read_json(path)
+            if snapshot is None:
+                return None
+            with self.__lock:
+                self.__snapshots[namespace] = (mtime, snapshot)
+        if time.time() - snapshot["time"] > self.ttl:
+            return None
+        return snapshot["streams"]
+
+    def save(self, namespace, streams):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.__path(namespace)
+        snapshot = {"time": time.time(), "streams": streams}
+        _write_json(path, snapshot)
+        with self.__lock:
+            self.__snapshots[namespace] = (os.path.getmtime(path), snapshot)
+
+    def clear(self, namespace=None):
+        if namespace is not None:
+            paths = [self.__path(namespace)]
+        elif os.path.isdir(self.directory):
+            paths = [
+                os.path.join(self.directory, n) for n in os.listdir(self.directory)
+            ]
+        else:
+            paths = []
+        with self.__lock:
+            if namespace is None:
+                self.__snapshots.clear()
+            else:
+                self.__snapshots.pop(namespace, None)
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
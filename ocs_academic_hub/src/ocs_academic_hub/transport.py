@@ -0,0 +1,68 @@
+#
+from gql.transport.requests import RequestsHTTPTransport
+from requests.adapters import HTTPAdapter, Retry
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_CONNECT_TIMEOUT = 10.0
+# the gateway answers 408 itself after about 100 seconds
+DEFAULT_READ_TIMEOUT = 180.0
+DEFAULT_RETRIES = 3
+
+TRANSPORT_OPTIONS = {
+    "pool_size": DEFAULT_POOL_SIZE,
+    "connect_timeout": DEFAULT_CONNECT_TIMEOUT,
+    "read_timeout": DEFAULT_READ_TIMEOUT,
+    "compress": True,
+    "retries": DEFAULT_RETRIES,
+}
+
+
+def wire_bytes(response):
+    """Bytes of a reply as received, before gzip/deflate decoding"""
+    content = response.content
+    try:
+        return response.raw.tell()
+    except (AttributeError, OSError):
+        return len(content)
+
+
+class HubTransport(RequestsHTTPTransport):
+    """gql transport of the gateway: one keep-alive session whose pool holds
+    `pool_size` connections (enough for the threads of a parallel read),
+    compressed replies and (connect, read) timeouts"""
+
+    def __init__(
+        self,
+        url,
+        headers=None,
+        verify=False,
+        pool_size=DEFAULT_POOL_SIZE,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        read_timeout=DEFAULT_READ_TIMEOUT,
+        compress=True,
+        retries=DEFAULT_RETRIES,
+    ):
+        super().__init__(
+            url=url,
+            headers=headers,
+            use_json=True,
+            timeout=(connect_timeout, read_timeout),
+            verify=verify,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=0.1,
+                status_forcelist=[500, 502, 503, 504],
+            ),
+        )
+        for prefix in "http://", "https://":
+            self.session.mount(prefix, adapter)
+        self.session.headers.update(
+            {
+                "Accept-Encoding": "gzip, deflate" if compress else "identity",
+                "Connection": "keep-alive",
+            }
+        )
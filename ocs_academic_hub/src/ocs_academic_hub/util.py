@@ -17,23 +17,55 @@ def get_last_runtime():
     return last_runtime
 
 
+def result_rows(value):
+    # rows of a DataFrame or pyarrow.Table result, None for anything else
+    if type(value) == pd.core.frame.DataFrame:
+        return len(value)
+    if type(value).__name__ == "Table" and hasattr(value, "num_rows"):
+        return value.num_rows
+    return None
+
+
+def record_call(obj, name, run_time, value, failed=False):
+    # methods of a client with a metrics registry (HubClient.metrics())
+    metrics = getattr(obj, "metrics", None)
+    if not callable(metrics):
+        return
+    registry = metrics()
+    if failed:
+        registry.inc("hub_call_errors_total", call=name)
+        return
+    registry.observe("hub_call_seconds", run_time, call=name)
+    rows = result_rows(value)
+    if rows is not None:
+        registry.inc("hub_call_rows_total", rows, call=name)
+
+
 def timer(func):
-    """Print the runtime of the decorated function"""
+    """Print the runtime of the decorated function, and record it in the
+    metrics of its client"""
 
     @functools.wraps(func)
     def wrapper_timer(*args, **kwargs):
         no_timer = kwargs.pop("no_timer", False)
         start_time = time.perf_counter()
-        value = func(*args, **kwargs)
+        try:
+            value = func(*args, **kwargs)
+        except BaseException:
+            if args:
+                record_call(args[0], func.__name__, 0.0, None, failed=True)
+            raise
         end_time = time.perf_counter()
         run_time = end_time - start_time
+        if args:
+            record_call(args[0], func.__name__, run_time, value)
         if not no_timer:
             function_info = f"  ==> Finished {func.__name__!r} in".ljust(50)
             print(f"{function_info} {run_time:.4f} secs", end="")
-            if type(value) == pd.core.frame.DataFrame:
+            if result_rows(value) is not None:
                 global last_runtime
                 last_runtime = run_time
-                rows_per_sec = len(value) / run_time
+                rows_per_sec = result_rows(value) / run_time
                 if rows_per_sec > 1000:
                     print(f" [ {rows_per_sec/1000.0:.2f}K rows/sec ]")
                 else:
@@ -56,11 +88,12 @@ def timer(func):
 
 
 def hub_authenticated(func):
-
     @functools.wraps(func)
     def wrapper_hub(*args, **kwargs):
         if not args[0].authenticated():
-            raise HubException("@@ You should authenticate with Hub first (cell with hub_login() )")
+            raise HubException(
+                "@@ You should authenticate with Hub first (cell with hub_login() )"
+            )
         value = func(*args, **kwargs)
         return value
 
@@ -87,4 +120,4 @@ def debug_requests_off():
     root_logger.handlers = []
     requests_log = logging.getLogger("requests.packages.urllib3")
     requests_log.setLevel(logging.WARNING)
-    requests_log.propagate = False
\ No newline at end of file
+    requests_log.propagate = False